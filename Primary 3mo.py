@@ -1,110 +1,56 @@
 import pandas as pd
 import warnings
 import numpy as np
-import pandas_market_calendars as mcal
 import matplotlib.pyplot as plt
-from pypfopt import EfficientFrontier, expected_returns, expected_returns, EfficientFrontier, objective_functions
-from datetime import datetime
-from Functions import *
+from rebalance.benchmark import benchmark_returns, equity_curves, relative_stats
+from rebalance.model import backtest, load_prices, walk_forward_weights
+from rebalance.results import save_results
 from scipy.stats import skew, kurtosis
-import quantstats as qs
 
 # Ignore warnings
 warnings.simplefilter("ignore", FutureWarning)  # Ignore UserWarning generated by .add_objective in pypfopt
 
 # Get and process data
 # Ticker data
-prices = pd.read_csv('data/Risk-Parity Main - OUTPUT.csv', index_col=0).dropna()
-prices.index = pd.to_datetime(prices.index)
+prices = load_prices('data/Risk-Parity Main - OUTPUT.csv')
 tickers = prices.columns
 daily_ret = np.log(prices / prices.shift(1))[1:]
 portfolio_value = 10000
+export_csv = False  # Also write the daily weights to weights.csv, results are always saved to results/
 
 # Benchmark data
-benchmark = ['QQQ']
-prices_benchmark_daily_ret = np.log(prices[benchmark] / prices[benchmark].shift(1))[1:]
+benchmark = ['QQQ', {'SPY': 0.6, 'TLT': 0.4}]  # Tickers and/or static-weight blends
+prices_benchmark_daily_ret = benchmark_returns(daily_ret, benchmark)
 
 backtest_monhts = 3
 test_days = 21*backtest_monhts
 trading_months = 1
 trading_days = 21*trading_months
 
-weights_df = pd.DataFrame()
+# Main portfolio calculations happen here, in rebalance.model so the regression harness and the search run the same
+# backtest. Every trading_days the weights are optimised on the previous test_days of prices
+weights_df, mu_df = walk_forward_weights(prices, test_days, trading_days)
+print(weights_df.to_string())
+result = backtest(prices, weights_df, portfolio_value)
+daily_weights = result['daily_weights']
+daily_weights_returns = pd.DataFrame({'Daily Pct Return': result['returns'] + 1, 'Portfolio Value': result['nav']})
+
+# Save the weights held each day, the weights and expected returns of every window (including the last one, whose
+# weights are for the next month and so are not in daily_weights) and the portfolio value in a compact binary file
+save_results('results/primary_3mo.npz', daily_weights, nav=result['nav'],
+             diagnostics=pd.DataFrame(mu_df.to_numpy(), columns=['mu ' + x for x in tickers]),
+             rebalance_weights=weights_df)
+if export_csv:
+    daily_weights.to_csv('weights.csv')
 
-backtest_frame = pd.DataFrame()
-backtest_frame = backtest_frame.append(dict(enumerate(np.zeros(len(tickers)))), ignore_index=True)
-backtest_frame = pd.DataFrame(np.repeat(backtest_frame.values, test_days, axis=0))
-backtest_frame.columns = tickers
-
-# Main portfolio calculations happen here. Certain operations in this block require the GLPK_MI solver for CVXPY,
-# which you can install using these instructions: http://cvxopt.org/install/index.html
-# You can also check the solvers installed on your environment by using the 'print(cvxpy.installed_solvers())' operation
-for z in range(test_days,len(prices),trading_days):
-
-    test = prices.iloc[z-test_days:z,:]
-    mu = expected_returns.ema_historical_return(test)
-    Sigma = cov_matrix_based(test)
-
-    ef = EfficientFrontier(mu, Sigma)
-
-    weights = ef.nonconvex_objective(
-    objective_functions.sharpe_ratio,
-    objective_args=(ef.expected_returns, ef.cov_matrix),
-    weights_sum_to_one=True,
-    )
-
-    cleaned_weights = ef.clean_weights()
-    cleaned_weights = dict(cleaned_weights)
-    weights_df = weights_df.append(cleaned_weights, ignore_index=True)
-
-    print(test)
-    print(cleaned_weights)
-
-# Creating Daily Weights DF from test data -> this will be our backtest data
-weights_df = weights_df[:-1]
-weights_df = pd.DataFrame(np.repeat(weights_df.values, trading_days, axis=0))
-weights_df.columns = tickers
-daily_weights = pd.concat([backtest_frame, weights_df])
-daily_ret = daily_ret.iloc[:-(len(daily_ret)-len(daily_weights))]
-daily_weights = daily_weights.set_index(daily_ret.index, inplace=False)
-daily_weights.columns = tickers
-daily_weights_returns = daily_weights.mul(daily_ret)
-
-daily_weights.to_csv('weights.csv')
-
-# Create total returns and portfolio value columns
-daily_weights_returns['Daily Pct Return'] = daily_weights_returns.sum(axis=1)+1
-daily_weights_returns = daily_weights_returns.reset_index(drop=False)
-daily_weights_returns['Portfolio Value'] = np.nan
-daily_weights_returns.at[0, 'Portfolio Value'] = portfolio_value
-for i, row in daily_weights_returns.iterrows():
-    if i == 0:
-        daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns['Portfolio Value'].iat[0]
-    else:
-        daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns.loc[i, 'Daily Pct Return'] * \
-                                                daily_weights_returns.loc[i - 1, 'Portfolio Value']
-        
 # Process benchmark data
-prices_benchmark_daily_ret = prices_benchmark_daily_ret.reset_index(drop=False)
-prices_benchmark_daily_ret['Portfolio Value'] = np.nan
-prices_benchmark_daily_ret.loc[[0], ['Portfolio Value']] = portfolio_value
-prices_benchmark_daily_ret.rename(columns={prices_benchmark_daily_ret.columns[0]: 'Daily Pct Return'}, inplace=True)
-prices_benchmark_daily_ret['Daily Pct Return'] = prices_benchmark_daily_ret.sum(axis=1)+1
-for i, row in prices_benchmark_daily_ret.iterrows():
-    if i == 0:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret['Portfolio Value'].iat[0]
-    else:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret.loc[i, 'Daily Pct Return'] * \
-                                                prices_benchmark_daily_ret.loc[i - 1, 'Portfolio Value']
-        
-prices_benchmark_daily_ret = prices_benchmark_daily_ret.iloc[:-(len(prices_benchmark_daily_ret)-len(daily_weights_returns))]
-prices_benchmark_daily_ret['index'] = daily_weights_returns.index
+benchmark_values = equity_curves(prices_benchmark_daily_ret, portfolio_value).iloc[:len(daily_weights_returns)]
 
 # Plot portfolio value and benchmark
 spacing = 10
 fig, ax = plt.subplots(figsize=(10, 6))
-plt1 = plt.plot(prices_benchmark_daily_ret['index'], prices_benchmark_daily_ret['Portfolio Value'], label=benchmark[0])
-plt2 = plt.plot(prices_benchmark_daily_ret['index'], daily_weights_returns['Portfolio Value'], label='Portfolio Value')
+plt1 = [plt.plot(benchmark_values.index, benchmark_values[x], label=x) for x in benchmark_values.columns]
+plt2 = plt.plot(benchmark_values.index, daily_weights_returns['Portfolio Value'], label='Portfolio Value')
 plt.legend()
 plt.xticks(rotation=45)
 
@@ -124,9 +70,7 @@ plt.show()
 
 # Calculate portfolio statistics
 # Calculate max drawdown
-daily_weights_returns.index = daily_ret.index
-rolling_max = daily_weights_returns['Portfolio Value'].rolling(252, min_periods=1).max()
-daily_drawdown = daily_weights_returns['Portfolio Value']/rolling_max - 1.0
+daily_drawdown = result['drawdown']
 max_daily_drawdown = daily_drawdown.rolling(252, min_periods=1).min()
 daily_drawdown.plot()
 plt.xticks(rotation=45)
@@ -137,18 +81,17 @@ print('Max portfolio drawdown: {:.2%}'.format(round((daily_drawdown.min()), 2)))
 
 # Calculate portfolio return statistics
 # Annual portfolio returns
-daily_weights_returns['Daily Pct Return'] = daily_weights_returns['Daily Pct Return']-1
-daily_weights_returns = daily_weights_returns.reset_index(drop=True)
-daily_weights_returns['index'] = pd.to_datetime(daily_weights_returns['index'])
-daily_weights_returns.set_index('index', inplace=True)
-portfolio_annual_return = daily_weights_returns['Daily Pct Return']\
-    .groupby(pd.Grouper(freq='Y')).apply(np.sum).mean()
+daily_weights_returns['Daily Pct Return'] = result['returns']
+portfolio_annual_return = result['annual_return']
 print('Average annual portfolio return: {:.2%}'.format(portfolio_annual_return))
 
 # Portfolio Sharpe
-portfolio_sharpe = daily_weights_returns['Daily Pct Return'].mean() / daily_weights_returns['Daily Pct Return'].std()
-portfolio_sharpe_annualised = (250**0.5) * portfolio_sharpe
+portfolio_sharpe_annualised = result['sharpe']
 print('Portfolio Sharpe ratio: {:.3}'.format(portfolio_sharpe_annualised))
+
+# Relative statistics against each benchmark
+print('------------------------------------------')
+print(relative_stats(daily_weights_returns['Daily Pct Return'], prices_benchmark_daily_ret).to_string())
 print('------------------------------------------')
 
 # Cumulative returns graph
@@ -6,6 +6,8 @@ import matplotlib.pyplot as plt
 from pypfopt import (EfficientFrontier, expected_returns, DiscreteAllocation, get_latest_prices)
 from datetime import datetime
 from Functions import start_date, start_date_six, semi_annual_cov
+from rebalance.benchmark import benchmark_returns, equity_curves, relative_stats
+from rebalance.results import save_results
 from scipy.stats import skew, kurtosis
 
 # Ignore warnings
@@ -14,7 +16,7 @@ warnings.simplefilter("ignore", UserWarning)  # Ignore UserWarning generated by
 # Define variables
 # I used some of the ETFs recommended in pg.11 of: https://papers.ssrn.com/sol3/papers.cfm?abstract_id=3272080
 # tickers = ['SPY', 'VBR', 'TLT', 'MDY', 'QQQ', 'GLD', 'VTV']  # This method is deprecated. Left for posterity.
-benchmark = ['SPY']  # Must be in your price file
+benchmark = ['SPY', {'SPY': 0.6, 'TLT': 0.4}]  # Tickers and/or static-weight blends, must be in your price file
 start = '2006-12-01'  # Include an extra previous month for dataframe calculations
 start_real = '2007-01-01'  # Date to start calculations
 end = '2021-12-31'  # Last day of the last year within the dataset
@@ -31,8 +33,7 @@ daily_ret_col = list(daily_ret.columns)
 half_ret = daily_ret.groupby(pd.Grouper(freq='6M')).apply(np.sum)
 
 # Benchmark data
-prices_benchmark = prices[benchmark]
-prices_benchmark_daily_ret = np.log(prices_benchmark / prices_benchmark.shift(1))[1:]
+prices_benchmark_daily_ret = benchmark_returns(daily_ret, benchmark)
 
 # Create list of trading days between start date and end date of training set
 start_dates = []
@@ -131,6 +132,7 @@ for x, y in trading_dates_draft:
     trading_dates_final.append(x)
     trading_dates_final.append(y)
 weights.index = trading_dates_final
+allocation_shares.index = trading_dates_final
 
 # Create a daily weights dataframe
 if end == end_real:
@@ -147,6 +149,8 @@ daily_weights.index = daily_trading_days
 # Calculate weighted stock returns
 del daily_trading_days[0]
 daily_ret.index = daily_trading_days
+# The benchmark returns get the same labels as the strategy returns, relative_stats aligns on them
+prices_benchmark_daily_ret.index = pd.to_datetime(daily_trading_days)
 daily_weights_returns = daily_weights.mul(daily_ret).dropna()
 daily_weights_returns.columns = daily_ret_col
 
@@ -162,24 +166,18 @@ for i, row in daily_weights_returns.iterrows():  # Loop by iterrows: fight me (o
         daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns.loc[i, 'Daily Pct Return'] * \
                                                 daily_weights_returns.loc[i - 1, 'Portfolio Value']
 
+# Save rebalance weights, share allocations and portfolio value in a compact binary file
+save_results('results/primary_6mo.npz', daily_weights, allocation_shares,
+             pd.Series(daily_weights_returns['Portfolio Value'].values, index=daily_weights_returns['index']))
+
 # Process benchmark data
-prices_benchmark_daily_ret = prices_benchmark_daily_ret.reset_index(drop=False)
-prices_benchmark_daily_ret['Portfolio Value'] = np.nan
-prices_benchmark_daily_ret.loc[[0], ['Portfolio Value']] = portfolio_value
-prices_benchmark_daily_ret.rename(columns={prices_benchmark_daily_ret.columns[0]: 'Daily Pct Return'}, inplace=True)
-prices_benchmark_daily_ret['Daily Pct Return'] = prices_benchmark_daily_ret.sum(axis=1)+1
-for i, row in prices_benchmark_daily_ret.iterrows():
-    if i == 0:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret['Portfolio Value'].iat[0]
-    else:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret.loc[i, 'Daily Pct Return'] * \
-                                                prices_benchmark_daily_ret.loc[i - 1, 'Portfolio Value']
-prices_benchmark_daily_ret['index'] = daily_trading_days
+benchmark_values = equity_curves(prices_benchmark_daily_ret, portfolio_value)
+benchmark_values.index = daily_trading_days
 
 # Plot portfolio value and benchmark
 spacing = 10
 fig, ax = plt.subplots(figsize=(10, 6))
-plt1 = plt.plot(prices_benchmark_daily_ret['index'], prices_benchmark_daily_ret['Portfolio Value'], label=benchmark[0])
+plt1 = [plt.plot(benchmark_values.index, benchmark_values[x], label=x) for x in benchmark_values.columns]
 plt2 = plt.plot(daily_weights_returns['index'], daily_weights_returns['Portfolio Value'], label='Portfolio Value')
 plt.legend()
 plt.xticks(rotation=45)
@@ -226,6 +224,10 @@ portfolio_sharpe = daily_weights_returns['Daily Pct Return'].mean() / daily_weig
 portfolio_sharpe_annualised = (250**0.5) * portfolio_sharpe
 print('Portfolio Sharpe ratio: {:.3}'.format(portfolio_sharpe_annualised))
 
+# Relative statistics against each benchmark
+print('------------------------------------------')
+print(relative_stats(daily_weights_returns['Daily Pct Return'], prices_benchmark_daily_ret).to_string())
+
 # Cumulative returns graph
 ax1 = plt.figure().add_axes([0.1, 0.1, 0.8, 0.8])
 ax1.hist(daily_weights_returns['Daily Pct Return'], bins=120)
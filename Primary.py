@@ -6,6 +6,9 @@ import matplotlib.pyplot as plt
 from pypfopt import (EfficientFrontier, expected_returns, DiscreteAllocation, get_latest_prices, objective_functions)
 from datetime import datetime
 from Functions import annual_cov, start_date
+from rebalance.cache import ResultCache, window_fingerprint
+from rebalance.benchmark import benchmark_returns, equity_curves, relative_stats
+from rebalance.results import save_results
 from scipy.stats import skew, kurtosis
 
 # Ignore warnings
@@ -14,11 +17,16 @@ warnings.simplefilter("ignore", UserWarning)  # Ignore UserWarning generated by
 # Define variables
 # I used the ETFs recommended in pg.11 of: https://papers.ssrn.com/sol3/papers.cfm?abstract_id=3272080
 tickers = ['SPY', 'VBR', 'TLT', 'MDY', 'QQQ', 'GLD', 'VTV']
-benchmark = ['SPY']
+benchmark = ['SPY', {'SPY': 0.6, 'TLT': 0.4}]  # Tickers and/or static-weight blends
 start = '2005-01-01'
 end = '2021-12-31'
 training_years = 1  # Number of years for which we calculate the expected return and covariance data
 portfolio_value = 5000  # Amount in dollars for initial portfolio value
+cache = ResultCache('cache')  # Per-window results are reused across runs, delete the folder to start fresh
+cache_config = {'version': 1,  # Bump after changing solve_window, so results from the old code aren't reused
+                'expected_returns': 'ema_historical_return', 'covariance': 'annual_cov',
+                'training_years': training_years, 'objective': 'nonconvex sharpe_ratio',
+                'portfolio_value': portfolio_value, 'tickers': tickers}
 
 # Get and process data
 # Ticker data
@@ -29,8 +37,7 @@ daily_ret_col = list(daily_ret.columns)
 annual_ret = daily_ret.groupby(pd.Grouper(freq='Y')).apply(np.sum)
 
 # Benchmark data
-prices_benchmark = prices[benchmark]
-prices_benchmark_daily_ret = np.log(prices_benchmark / prices_benchmark.shift(1))[1:]
+prices_benchmark_daily_ret = benchmark_returns(daily_ret, benchmark)
 
 # Create list of trading days between start date and end date of training set
 # Earliest and latest date of a year
@@ -66,28 +73,34 @@ for k, v in training_date_range:
     prices_dataframe = prices.loc[datetime.strptime(str(nyse_trading_date_range_index[0]), '%Y-%m-%d'):
                                   datetime.strptime(str(nyse_trading_date_range_index[-1]), '%Y-%m-%d')]
 
-    # Calculate efficient frontier with given covariance matrix and expected returns
-    prices_expected_returns = expected_returns.ema_historical_return(prices_dataframe)
-    covariance_matrix = annual_cov(training_years, nyse_trading_date_range_index[0], prices_expected_returns, tickers)
-    ef = EfficientFrontier(prices_expected_returns, covariance_matrix)
-
-    # Optimise portfolio and give weights
-    # Making the problem into a nonconvex objective because pypfopt changed their backend to a convex optimiser
-    raw_weights = ef.nonconvex_objective(
-        objective_functions.sharpe_ratio,
-        objective_args=(ef.expected_returns, ef.cov_matrix),
-        weights_sum_to_one=True,
-    )
-    cleaned_weights = ef.clean_weights()
-
-    # Append weights to dataframe 'weights'
-    cleaned_weights = dict(cleaned_weights)
+    # Calculate efficient frontier with given covariance matrix and expected returns, then optimise the portfolio
+    # Windows whose prices and settings haven't changed since the last run are loaded from the cache instead
+    def solve_window():
+        prices_expected_returns = expected_returns.ema_historical_return(prices_dataframe)
+        covariance_matrix = annual_cov(training_years, nyse_trading_date_range_index[0], prices_expected_returns,
+                                       tickers)
+        ef = EfficientFrontier(prices_expected_returns, covariance_matrix)
+
+        # Optimise portfolio and give weights
+        # Making the problem into a nonconvex objective because pypfopt changed their backend to a convex optimiser
+        raw_weights = ef.nonconvex_objective(
+            objective_functions.sharpe_ratio,
+            objective_args=(ef.expected_returns, ef.cov_matrix),
+            weights_sum_to_one=True,
+        )
+        cleaned_weights = dict(ef.clean_weights())
+
+        # Get allocation in shares
+        latest_prices = get_latest_prices(prices_dataframe)
+        da = DiscreteAllocation(cleaned_weights, latest_prices, total_portfolio_value=portfolio_value)
+        allocation, leftover = da.lp_portfolio()
+        return prices_expected_returns, covariance_matrix, cleaned_weights, allocation
+
+    key = window_fingerprint(prices_dataframe, cache_config)
+    prices_expected_returns, covariance_matrix, cleaned_weights, allocation = cache.cached(key, solve_window)
+
+    # Append weights and allocation to dataframes 'weights' and 'allocation_shares'
     weights = weights.append(dict(cleaned_weights), ignore_index=True)
-
-    # Get allocation in shares
-    latest_prices = get_latest_prices(prices_dataframe)
-    da = DiscreteAllocation(cleaned_weights, latest_prices, total_portfolio_value=portfolio_value)
-    allocation, leftover = da.lp_portfolio()
     allocation_shares = allocation_shares.append(dict(allocation), ignore_index=True).set_index(weights.index)
 
 # Clean up weights dataframe
@@ -96,6 +109,7 @@ for x in trading_start_dates:
     four_digit_year = x[0:4]
     trading_start_years.append(four_digit_year)
 weights.index = trading_start_years
+allocation_shares.index = trading_start_dates
 
 # Create a daily weights dataframe
 daily_trading_days = mcal.date_range(nyse.schedule(start, end), frequency='1D')\
@@ -109,6 +123,8 @@ daily_weights.index = daily_trading_days
 # Calculate weighted stock returns
 daily_trading_days_modified = daily_trading_days[1:]  # dropping first date, which was used for calculations
 daily_ret.index = daily_trading_days_modified
+# The benchmark returns get the same labels as the strategy returns, relative_stats aligns on them
+prices_benchmark_daily_ret.index = pd.to_datetime(daily_trading_days_modified)
 daily_weights_returns = daily_weights.mul(daily_ret).dropna()
 daily_weights_returns.columns = daily_ret_col
 
@@ -124,24 +140,18 @@ for i, row in daily_weights_returns.iterrows():  # Loop by iterrows: fight me (o
         daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns.loc[i, 'Daily Pct Return'] * \
                                                 daily_weights_returns.loc[i - 1, 'Portfolio Value']
 
+# Save rebalance weights, share allocations and portfolio value in a compact binary file
+save_results('results/primary.npz', daily_weights, allocation_shares,
+             pd.Series(daily_weights_returns['Portfolio Value'].values, index=daily_weights_returns['index']))
+
 # Process benchmark data
-prices_benchmark_daily_ret = prices_benchmark_daily_ret.reset_index(drop=False)
-prices_benchmark_daily_ret['Portfolio Value'] = np.nan
-prices_benchmark_daily_ret.loc[[0], ['Portfolio Value']] = portfolio_value
-prices_benchmark_daily_ret.rename(columns={prices_benchmark_daily_ret.columns[0]: 'Daily Pct Return'}, inplace=True)
-prices_benchmark_daily_ret['Daily Pct Return'] = prices_benchmark_daily_ret.sum(axis=1)+1
-for i, row in prices_benchmark_daily_ret.iterrows():
-    if i == 0:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret['Portfolio Value'].iat[0]
-    else:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret.loc[i, 'Daily Pct Return'] * \
-                                                prices_benchmark_daily_ret.loc[i - 1, 'Portfolio Value']
-prices_benchmark_daily_ret['index'] = daily_trading_days_modified
+benchmark_values = equity_curves(prices_benchmark_daily_ret, portfolio_value)
+benchmark_values.index = daily_trading_days_modified
 
 # Plot portfolio value and benchmark
 spacing = 10
 fig, ax = plt.subplots(figsize=(10, 6))
-plt1 = plt.plot(prices_benchmark_daily_ret['index'], prices_benchmark_daily_ret['Portfolio Value'], label=benchmark[0])
+plt1 = [plt.plot(benchmark_values.index, benchmark_values[x], label=x) for x in benchmark_values.columns]
 plt2 = plt.plot(daily_weights_returns['index'], daily_weights_returns['Portfolio Value'], label='Portfolio Value')
 plt.legend()
 plt.xticks(rotation=45)
@@ -188,6 +198,10 @@ portfolio_sharpe = daily_weights_returns['Daily Pct Return'].mean() / daily_weig
 portfolio_sharpe_annualised = (250**0.5) * portfolio_sharpe
 print('Portfolio Sharpe ratio: {:.2}'.format(portfolio_sharpe_annualised))
 
+# Relative statistics against each benchmark
+print('------------------------------------------')
+print(relative_stats(daily_weights_returns['Daily Pct Return'], prices_benchmark_daily_ret).to_string())
+
 # Cumulative returns graph
 ax1 = plt.figure().add_axes([0.1, 0.1, 0.8, 0.8])
 ax1.hist(daily_weights_returns['Daily Pct Return'], bins=120)
@@ -6,6 +6,9 @@ import matplotlib.pyplot as plt
 from pypfopt import (EfficientFrontier, objective_functions, expected_returns, DiscreteAllocation, get_latest_prices)
 from datetime import datetime
 from Functions import annual_cov, start_date, start_of_month
+from rebalance.benchmark import benchmark_returns, equity_curves, relative_stats
+from rebalance.results import save_results
+from rebalance.kernels import gtt_nav
 from scipy.stats import skew, kurtosis
 
 # Ignore warnings
@@ -14,7 +17,7 @@ warnings.simplefilter("ignore", UserWarning)  # Ignore UserWarning generated by
 # Define variables
 # I used the ETFs recommended in pg.11 of: https://papers.ssrn.com/sol3/papers.cfm?abstract_id=3272080
 tickers = ['SPY', 'VBR', 'TLT', 'MDY', 'QQQ', 'GLD']
-benchmark = ['SPY']
+benchmark = ['SPY', {'SPY': 0.6, 'TLT': 0.4}]  # Tickers and/or static-weight blends
 start = '2005-01-01'
 end = '2020-12-31'
 training_years = 1  # Number of years for which we calculate the expected return and covariance data
@@ -29,8 +32,7 @@ daily_ret_col = list(daily_ret.columns)
 annual_ret = daily_ret.groupby(pd.Grouper(freq='Y')).apply(np.sum)
 
 # Benchmark data
-prices_benchmark = prices[benchmark]
-prices_benchmark_daily_ret = np.log(prices_benchmark / prices_benchmark.shift(1))[1:]
+prices_benchmark_daily_ret = benchmark_returns(daily_ret, benchmark)
 
 # FRED data
 UNRATE = pd.read_csv('data/UNRATE.csv', index_col=0).dropna()  # Unemployment Rate
@@ -110,6 +112,7 @@ for x in trading_start_dates:
     four_digit_year = x[0:4]
     trading_start_years.append(four_digit_year)
 weights.index = trading_start_years
+allocation_shares.index = trading_start_dates
 
 # Create a daily weights dataframe
 daily_trading_days = mcal.date_range(nyse.schedule(start, end), frequency='1D')\
@@ -123,6 +126,8 @@ daily_weights.index = daily_trading_days
 # Calculate weighted stock returns
 daily_trading_days_modified = daily_trading_days[:-1]  # Temporary solution, dropping extra 1 item from list
 daily_ret.index = daily_trading_days_modified
+# The benchmark returns get the same labels as the strategy returns, relative_stats aligns on them
+prices_benchmark_daily_ret.index = pd.to_datetime(daily_trading_days_modified)
 daily_weights_returns = daily_weights.mul(daily_ret).dropna()
 daily_weights_returns.columns = daily_ret_col
 
@@ -152,7 +157,7 @@ conditions_signal3 = [(final_df['UnemploymentMA'] == 1) & (final_df['indicator1'
 conditions_signal4 = [(final_df['UnemploymentMA'] == 1) & (final_df['indicator1'] == 0)]
 final_df['signal_unemployment'] = np.select(conditions_signal3, ['True'])
 final_df['signal_unemployment'] = np.select(conditions_signal4, ['False'])
-final_df['signal_unemployment'] = np.where(final_df['UnemploymentMA'] == 0, 'True', 'False')
+final_df['signal_unemployment'] = final_df['UnemploymentMA'] == 0  # True when invested, False when in cash
 
 # Signals dataset: final touches
 signal_nyse_trading_date_range = nyse.schedule(signal_trading_month_start[0], signal_trading_month_end[-1])
@@ -162,38 +167,25 @@ signal_nyse_trading_date_range_index = mcal.date_range(signal_nyse_trading_date_
 final_df = final_df.reindex(signal_nyse_trading_date_range_index, method='ffill')
 
 # Create total returns and portfolio value columns
-daily_weights_returns['signal'] = final_df['signal_unemployment']
+# Days without a signal stay invested. The switch to cash runs in the compiled kernel rather than row by row
+invested = final_df['signal_unemployment'].reindex(daily_weights_returns.index).fillna(True).to_numpy(dtype=bool)
 daily_weights_returns['Daily Pct Return'] = daily_weights_returns.sum(axis=1)+1
-daily_weights_returns['Daily Pct Return'] = np.where(daily_weights_returns['signal'] == 'False', 1,
-                                                     daily_weights_returns['Daily Pct Return'])
+daily_weights_returns['signal'] = invested
 daily_weights_returns = daily_weights_returns.reset_index(drop=False)
-daily_weights_returns['Portfolio Value'] = np.nan
-daily_weights_returns.at[0, 'Portfolio Value'] = portfolio_value
-for i, row in daily_weights_returns.iterrows():  # Loop by iterrows: fight me (or please suggest something better)
-    if i == 0:
-        daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns['Portfolio Value'].iat[0]
-    else:
-        daily_weights_returns.loc[i, 'Portfolio Value'] = daily_weights_returns.loc[i, 'Daily Pct Return'] * \
-                                                daily_weights_returns.loc[i - 1, 'Portfolio Value']
+daily_weights_returns['Portfolio Value'] = gtt_nav(daily_weights_returns['Daily Pct Return'], invested, portfolio_value)
+
+# Save rebalance weights, share allocations and portfolio value in a compact binary file
+save_results('results/primary_gtt.npz', daily_weights, allocation_shares,
+             pd.Series(daily_weights_returns['Portfolio Value'].values, index=daily_weights_returns['index']))
 
 # Process benchmark data
-prices_benchmark_daily_ret = prices_benchmark_daily_ret.reset_index(drop=False)
-prices_benchmark_daily_ret['Portfolio Value'] = np.nan
-prices_benchmark_daily_ret.loc[[0], ['Portfolio Value']] = portfolio_value
-prices_benchmark_daily_ret.rename(columns={prices_benchmark_daily_ret.columns[0]: 'Daily Pct Return'}, inplace=True)
-prices_benchmark_daily_ret['Daily Pct Return'] = prices_benchmark_daily_ret.sum(axis=1)+1
-for i, row in prices_benchmark_daily_ret.iterrows():
-    if i == 0:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret['Portfolio Value'].iat[0]
-    else:
-        prices_benchmark_daily_ret.loc[i, 'Portfolio Value'] = prices_benchmark_daily_ret.loc[i, 'Daily Pct Return'] * \
-                                                prices_benchmark_daily_ret.loc[i - 1, 'Portfolio Value']
-prices_benchmark_daily_ret['index'] = daily_trading_days_modified
+benchmark_values = equity_curves(prices_benchmark_daily_ret, portfolio_value)
+benchmark_values.index = daily_trading_days_modified
 
 # Plot portfolio value and benchmark
 spacing = 10
 fig, ax = plt.subplots(figsize=(10, 6))
-plt1 = plt.plot(prices_benchmark_daily_ret['index'], prices_benchmark_daily_ret['Portfolio Value'], label=benchmark[0])
+plt1 = [plt.plot(benchmark_values.index, benchmark_values[x], label=x) for x in benchmark_values.columns]
 plt2 = plt.plot(daily_weights_returns['index'], daily_weights_returns['Portfolio Value'], label='Portfolio Value')
 plt.legend()
 plt.xticks(rotation=45)
@@ -226,7 +218,8 @@ print('Max portfolio drawdown: {:.2%}'.format(round((daily_drawdown.min()), 2)))
 
 # Calculate portfolio return statistics
 # Annual portfolio returns
-daily_weights_returns['Daily Pct Return'] = daily_weights_returns['Daily Pct Return']-1
+daily_weights_returns['Daily Pct Return'] = np.where(daily_weights_returns['signal'],
+                                                     daily_weights_returns['Daily Pct Return']-1, 0)  # Cash earns 0
 daily_weights_returns = daily_weights_returns.reset_index(drop=True)
 daily_weights_returns['index'] = pd.to_datetime(daily_weights_returns['index'])
 daily_weights_returns.set_index('index', inplace=True)
@@ -239,6 +232,10 @@ portfolio_sharpe = daily_weights_returns['Daily Pct Return'].mean() / daily_weig
 portfolio_sharpe_annualised = (250**0.5) * portfolio_sharpe
 print('Portfolio Sharpe ratio: {:.2}'.format(portfolio_sharpe_annualised))
 
+# Relative statistics against each benchmark
+print('------------------------------------------')
+print(relative_stats(daily_weights_returns['Daily Pct Return'], prices_benchmark_daily_ret).to_string())
+
 # Cumulative returns graph
 ax1 = plt.figure().add_axes([0.1, 0.1, 0.8, 0.8])
 ax1.hist(daily_weights_returns['Daily Pct Return'], bins=120)
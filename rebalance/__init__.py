@@ -0,0 +1,14 @@
+"""
+Library version of the Primary models. Submodules are only imported when first used (e.g. rebalance.model), so
+importing the package is cheap and the heavy dependencies are only loaded by the code paths that need them.
+"""
+import importlib
+
+__all__ = ['allocation', 'benchmark', 'cache', 'chunked', 'datasources', 'estimators', 'functions', 'jobqueue',
+           'kernels', 'model', 'regression', 'results', 'scenarios', 'search', 'streaming']
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,349 @@
+"""
+Command line entry point, e.g.:
+    python -m rebalance weights --prices data/price_data_3mo_2.csv --value 9200 --timings
+    python -m rebalance weights --download --value 9200
+    python -m rebalance weights --prices data/price_data_3mo_2.csv --accounts accounts.csv
+    python -m rebalance refresh --tickers SPY TLT GLD --fred UNRATE
+    python -m rebalance stress --prices data/price_data_annual.csv --results results/*.npz
+    python -m rebalance chunked --prices data/price_data_3mo.csv --store data/cache/store
+    python -m rebalance regress --models 3mo --repeats 3
+    python -m rebalance search --prices data/price_data_3mo.csv --lookbacks 252 126 63 --cadences 63 21
+    python -m rebalance sweep enqueue --db sweep.db --prices data/price_data_3mo.csv
+    python -m rebalance sweep work --db sweep.db --prices data/price_data_3mo.csv --workers 4
+    python -m rebalance monitor --prices data/price_data_3mo_2.csv --replay data/price_data_3mo.csv
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+start_time = time.perf_counter()
+
+TICKERS = ['GLD', 'MDY', 'QQQ', 'SPY', 'TLT', 'VBR', 'VTV', 'PSQ']
+HEAVY_MODULES = ['matplotlib', 'quantstats', 'cvxpy', 'yfinance', 'pandas_market_calendars', 'scipy']
+
+
+def get_prices(args):
+    from rebalance.model import download_prices, load_prices
+    if args.download:
+        today = datetime.now()
+        quarter = today - timedelta(days=90)
+        return download_prices(args.tickers, quarter.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'))
+    return load_prices(args.prices)
+
+
+def weights(args):
+    from rebalance.model import recommend
+    timings = [('Imports', time.perf_counter() - start_time)]
+
+    tick = time.perf_counter()
+    prices = get_prices(args)
+    timings.append(('Load prices', time.perf_counter() - tick))
+
+    tick = time.perf_counter()
+    recommended_weights, recommended_shares = recommend(prices, args.value, args.lookback, not args.no_cash)
+    timings.append(('Optimisation', time.perf_counter() - tick))
+
+    print('-------------------------------------------------------------------')
+    print('Calculations performed for period between {} and {}'.format(
+        prices.index[0].strftime('%Y-%m-%d'), prices.index[-1].strftime('%Y-%m-%d')))
+    print('-------------------------------------------------------------------')
+    print("Recommended portfolio weights (by percent):")
+    print(recommended_weights.to_string())
+    print('-------------------------------------------------------------------')
+    print("Recommended portfolio weights (by shares):")
+    print(recommended_shares.to_string())
+    print('-------------------------------------------------------------------')
+
+    if args.accounts:
+        import pandas as pd
+        from rebalance.allocation import batch_allocation
+
+        # Share orders for every account from the same weights, accounts csv columns: account, value[, lot, buffer]
+        tick = time.perf_counter()
+        accounts = pd.read_csv(args.accounts, index_col=0)
+        latest_prices = prices.iloc[-1].reindex(recommended_weights.index).fillna(1)  # CASH is always 1
+        account_shares, leftover = batch_allocation(recommended_weights, latest_prices, accounts['value'],
+                                                    accounts.get('lot', 1), accounts.get('buffer', 0.0))
+        timings.append(('Batch allocation ({} accounts)'.format(len(accounts)), time.perf_counter() - tick))
+        print("Orders (by shares) per account:")
+        print(pd.concat([account_shares, leftover], axis=1).to_string())
+        print('-------------------------------------------------------------------')
+
+    if args.timings:
+        for name, seconds in timings:
+            print('{}: {:.3f}s'.format(name, seconds))
+        print('Heavy modules loaded: {}'.format(', '.join(x for x in HEAVY_MODULES if x in sys.modules) or 'none'))
+    return recommended_weights
+
+
+def monitor(args):
+    import numpy as np
+    from rebalance.streaming import mark_to_market, replay_prices
+
+    recommended_weights = weights(args)
+    stocks = [x for x in recommended_weights.index if x != 'CASH']
+    closes = replay_prices(args.replay, stocks)
+    columns = list(stocks)  # Separate list, replay_prices only reads its tickers once the replay starts
+    if 'CASH' in recommended_weights.index:
+        closes = ((date, np.append(close, 1)) for date, close in closes)  # Cash is always 1
+        columns.append('CASH')
+    snapshot = None
+    for snapshot in mark_to_market(closes, recommended_weights[columns], args.value, args.drift, args.drawdown):
+        if snapshot['event'] is not None:
+            print('{}: {} event, NAV {:.2f}, drawdown {:.2%}, drift {:.2%}, realised vol {:.2%}'.format(
+                snapshot['date'].strftime('%Y-%m-%d'), snapshot['event'], snapshot['nav'], snapshot['drawdown'],
+                snapshot['drift'], snapshot['realised_vol']))
+    if snapshot is not None:
+        print('Final NAV: {:.2f}'.format(snapshot['nav']))
+
+
+def refresh(args):
+    from rebalance.datasources import FRED_URL, HTTPSource, YahooSource, refresh as refresh_sources
+
+    # Prices and FRED series are fetched concurrently and written to the cache directory
+    tick = time.perf_counter()
+    price_source = YahooSource() if args.url is None else HTTPSource(args.url)
+    fred_source = HTTPSource(args.fred_url or FRED_URL)
+    requests = [(price_source, x) for x in args.tickers] + [(fred_source, x) for x in args.fred]
+    start = (datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%d')
+    results = refresh_sources(requests, start=start, concurrency=args.concurrency, retries=args.retries,
+                              timeout=args.timeout, cache_dir=args.cache)
+    for name, series in results.items():
+        print('{}: {} rows, last {}'.format(name, len(series), series.index[-1].strftime('%Y-%m-%d')))
+    print('Fetched {} series in {:.2f}s'.format(len(results), time.perf_counter() - tick))
+
+
+def stress(args):
+    import os
+    import pandas as pd
+    from rebalance.model import load_prices
+    from rebalance.results import latest_weights, load_results
+    from rebalance.scenarios import SCENARIOS, build_scenarios, stress_test
+
+    # Latest rebalance weights of every model, one row per results file
+    weights = pd.DataFrame([latest_weights(load_results(x)) for x in args.results],
+                           index=[os.path.splitext(os.path.basename(x))[0] for x in args.results])
+    panel = build_scenarios(load_prices(args.prices))
+    if not panel:
+        sys.exit('{} covers none of the scenarios: {}'.format(args.prices, ', '.join(SCENARIOS)))
+    tick = time.perf_counter()
+    pnl, drawdown = stress_test(weights, panel)
+    elapsed = time.perf_counter() - tick
+
+    print('-------------------------------------------------------------------')
+    print('Scenario P&L:')
+    print(pnl.T.to_string(float_format='{:.2%}'.format))
+    print('-------------------------------------------------------------------')
+    print('Scenario max drawdown:')
+    print(drawdown.T.to_string(float_format='{:.2%}'.format))
+    print('-------------------------------------------------------------------')
+    skipped = [x for x in SCENARIOS if x not in panel]
+    if skipped:
+        print('Not covered by the price file: {}'.format(', '.join(skipped)))
+    print('Stress tested {} portfolios over {} scenarios in {:.2f}ms'.format(
+        len(weights), len(panel), 1000 * elapsed))
+
+
+def chunked(args):
+    import os
+    import pandas as pd
+    from rebalance.chunked import chunked_backtest, chunked_stats, open_return_store, write_return_store
+    from rebalance.results import load_results
+
+    # The return store is built once from the csv and memory-mapped on later runs
+    tick = time.perf_counter()
+    if args.rebuild or not os.path.exists(os.path.join(args.store, 'meta.json')):
+        rows = write_return_store(args.prices, args.store, chunksize=args.chunksize)
+        print('Wrote {} return rows to {} in {:.2f}s'.format(rows, args.store, time.perf_counter() - tick))
+    dates, returns, tickers = open_return_store(args.store)
+
+    # Rebalance weights of a saved model, or equal weights held from the first day
+    if args.results:
+        weights = load_results(args.results)['weights'].reindex(columns=tickers, fill_value=0.0)
+    else:
+        weights = pd.DataFrame([[1 / len(tickers)] * len(tickers)], index=[pd.Timestamp(dates[0])], columns=tickers)
+
+    tick = time.perf_counter()
+    blocks = chunked_backtest(args.store, weights.index, weights, args.value, args.block_size, args.window)
+    stats = chunked_stats(blocks)
+    print('-------------------------------------------------------------------')
+    for name, value in stats.items():
+        print('{}: {:.4f}'.format(name, value))
+    print('-------------------------------------------------------------------')
+    print('Backtested {} days over {} rebalances in {:.2f}s'.format(len(returns), len(weights),
+                                                                     time.perf_counter() - tick))
+
+
+def regress(args):
+    from rebalance.regression import GOLDEN_DIR, run
+
+    # Non-zero exit code when any model's output changed, so it can gate a commit
+    if not run(args.models, args.golden or GOLDEN_DIR, args.update, args.rtol, args.atol, args.repeats):
+        sys.exit(1)
+
+
+def search(args):
+    from concurrent.futures import ProcessPoolExecutor
+    from rebalance.model import load_prices
+    from rebalance.search import config_grid, successive_halving
+
+    prices = load_prices(args.prices)
+    universes = [x.split(',') for x in args.universes] if args.universes else [list(prices.columns)]
+    configs = config_grid(args.lookbacks, args.cadences, universes, args.estimators)
+    with ProcessPoolExecutor(args.workers) as executor:
+        ranked = successive_halving(prices, configs, eta=args.eta, executor=executor)
+    print('-------------------------------------------------------------------')
+    for config, score in ranked:
+        print('Sharpe {:.3} | {}'.format(score, config))
+
+
+def sweep(args):
+    from rebalance import jobqueue
+
+    db = jobqueue.connect(args.db)
+    if args.action == 'enqueue':
+        import pandas as pd
+        from rebalance.search import config_grid
+
+        tickers = list(pd.read_csv(args.prices, index_col=0, nrows=0, encoding='utf-8-sig').columns)
+        universes = [x.split(',') for x in args.universes] if args.universes else [tickers]
+        configs = config_grid(args.lookbacks, args.cadences, universes, args.estimators)
+        added = jobqueue.enqueue(db, configs, jobqueue.file_fingerprint(args.prices))
+        print('Enqueued {} of {} configs'.format(added, len(configs)))
+
+    elif args.action == 'work':
+        import functools
+        from multiprocessing import Process
+        from rebalance.search import evaluate_unit
+
+        # Only units enqueued with this copy of the prices are claimed, the others are left for workers that have it
+        fingerprint = jobqueue.file_fingerprint(args.prices)
+        evaluate = functools.partial(evaluate_unit, args.prices)
+        workers = [Process(target=jobqueue.run_worker, args=(args.db, evaluate),
+                           kwargs={'lease': args.lease, 'timeout': args.timeout, 'fingerprint': fingerprint})
+                   for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        skipped = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND fingerprint != ?",
+                             (fingerprint,)).fetchone()[0]
+        if skipped:
+            print('Left {} units enqueued with different data than {}'.format(skipped, args.prices))
+
+    print('Progress: {}'.format(jobqueue.progress(db)))
+    ranked = sorted(jobqueue.results(db), key=lambda x: -x[1]['sharpe'])
+    for config, result in ranked[:args.top]:
+        print('Sharpe {:.3} | {}'.format(result['sharpe'], config))
+    db.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m rebalance', description='Max Sharpe efficient frontier models')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_weights_arguments(subparser):
+        source = subparser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--prices', help='local price csv')
+        source.add_argument('--download', action='store_true', help='download the last 90 days from Yahoo Finance')
+        subparser.add_argument('--tickers', nargs='+', default=TICKERS, help='tickers to download')
+        subparser.add_argument('--value', type=float, default=9200, help='portfolio value in dollars')
+        subparser.add_argument('--lookback', type=int, default=None, help='number of most recent days to train on')
+        subparser.add_argument('--no-cash', action='store_true', help="don't add a CASH asset")
+        subparser.add_argument('--timings', action='store_true', help='print import and run times')
+        subparser.add_argument('--accounts', help='csv of accounts (account, value[, lot, buffer]) to allocate')
+
+    weights_parser = subparsers.add_parser('weights', help='recommended weights and shares for the next period')
+    add_weights_arguments(weights_parser)
+    weights_parser.set_defaults(func=weights)
+
+    monitor_parser = subparsers.add_parser('monitor', help='replay daily closes through the mark-to-market monitor')
+    add_weights_arguments(monitor_parser)
+    monitor_parser.add_argument('--replay', required=True, help='price csv to replay one day at a time')
+    monitor_parser.add_argument('--drift', type=float, default=0.05, help='drift event threshold')
+    monitor_parser.add_argument('--drawdown', type=float, default=-0.10, help='drawdown event threshold')
+    monitor_parser.set_defaults(func=monitor)
+
+    refresh_parser = subparsers.add_parser('refresh', help='fetch prices and FRED series concurrently into a cache')
+    refresh_parser.add_argument('--tickers', nargs='+', default=TICKERS, help='tickers to fetch')
+    refresh_parser.add_argument('--fred', nargs='*', default=['UNRATE'], help='FRED series to fetch')
+    refresh_parser.add_argument('--url', default=None,
+                                help='csv url template for prices, e.g. http://127.0.0.1:8000/{name}.csv '
+                                     '(defaults to Yahoo Finance)')
+    refresh_parser.add_argument('--fred-url', default=None, help='csv url template for FRED series')
+    refresh_parser.add_argument('--days', type=int, default=90, help='number of days of history to keep')
+    refresh_parser.add_argument('--cache', default='data/cache', help='directory the series are written to')
+    refresh_parser.add_argument('--concurrency', type=int, default=8, help='maximum requests in flight')
+    refresh_parser.add_argument('--retries', type=int, default=2, help='retries per request')
+    refresh_parser.add_argument('--timeout', type=float, default=30.0, help='seconds per attempt')
+    refresh_parser.set_defaults(func=refresh)
+
+    stress_parser = subparsers.add_parser('stress', help='apply the latest weights of saved models to stress scenarios')
+    stress_parser.add_argument('--prices', required=True, help='price csv covering the scenarios')
+    stress_parser.add_argument('--results', nargs='+', required=True, help='results files saved by the models')
+    stress_parser.set_defaults(func=stress)
+
+    chunked_parser = subparsers.add_parser('chunked', help='out-of-core backtest over a memory-mapped return store')
+    chunked_parser.add_argument('--prices', required=True, help='price csv the store is built from')
+    chunked_parser.add_argument('--store', required=True, help='directory of the return store')
+    chunked_parser.add_argument('--results', default=None, help='results file whose weights are backtested, '
+                                                                'defaults to equal weights')
+    chunked_parser.add_argument('--value', type=float, default=9200, help='portfolio value in dollars')
+    chunked_parser.add_argument('--rebuild', action='store_true', help='rebuild the store even if it exists')
+    chunked_parser.add_argument('--chunksize', type=int, default=100000, help='csv rows read at a time')
+    chunked_parser.add_argument('--block-size', type=int, default=65536, help='return rows processed at a time')
+    chunked_parser.add_argument('--window', type=int, default=252, help='rows in the rolling drawdown window')
+    chunked_parser.set_defaults(func=chunked)
+
+    regress_parser = subparsers.add_parser('regress', help='check the models against golden output snapshots')
+    regress_parser.add_argument('--models', nargs='+', default=None,
+                                help='models to run (annual, 6mo, 3mo, gtt), defaults to the gated ones (3mo)')
+    regress_parser.add_argument('--golden', default=None,
+                                help='directory of the golden snapshots, defaults to data/golden in the repo')
+    regress_parser.add_argument('--update', action='store_true', help='overwrite the golden snapshots')
+    regress_parser.add_argument('--rtol', type=float, default=1e-7, help='relative tolerance')
+    regress_parser.add_argument('--atol', type=float, default=1e-9, help='absolute tolerance')
+    regress_parser.add_argument('--repeats', type=int, default=3, help='runs per model, the fastest is timed')
+    regress_parser.set_defaults(func=regress)
+
+    search_parser = subparsers.add_parser('search', help='successive-halving search over strategy configurations')
+    search_parser.add_argument('--prices', required=True, help='price csv')
+    search_parser.add_argument('--lookbacks', type=int, nargs='+', default=[252, 126, 63], help='training days')
+    search_parser.add_argument('--cadences', type=int, nargs='+', default=[252, 126, 63, 21], help='rebalance days')
+    search_parser.add_argument('--universes', nargs='*', help='comma separated ticker lists, defaults to all tickers')
+    search_parser.add_argument('--estimators', nargs='+', default=['ema', 'mean', 'capm'], help='expected returns')
+    search_parser.add_argument('--eta', type=int, default=3, help='keep the best 1/eta configurations at each rung')
+    search_parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    search_parser.set_defaults(func=search)
+
+    sweep_parser = subparsers.add_parser('sweep', help='run a sweep through a shared SQLite job queue')
+    sweep_parser.add_argument('action', choices=['enqueue', 'work', 'status'],
+                              help='enqueue the grid (coordinator), work on it (any node) or show progress')
+    sweep_parser.add_argument('--db', required=True, help='SQLite queue file, on storage shared by the nodes')
+    sweep_parser.add_argument('--prices', help='price csv, required to enqueue and work (each node uses its own '
+                                               'copy, checked by fingerprint)')
+    sweep_parser.add_argument('--lookbacks', type=int, nargs='+', default=[252, 126, 63], help='training days')
+    sweep_parser.add_argument('--cadences', type=int, nargs='+', default=[252, 126, 63, 21], help='rebalance days')
+    sweep_parser.add_argument('--universes', nargs='*', help='comma separated ticker lists, defaults to all tickers')
+    sweep_parser.add_argument('--estimators', nargs='+', default=['ema', 'mean', 'capm'], help='expected returns')
+    sweep_parser.add_argument('--workers', type=int, default=1, help='worker processes on this node')
+    sweep_parser.add_argument('--lease', type=float, default=600.0,
+                              help='seconds without a heartbeat before a unit is retried')
+    sweep_parser.add_argument('--timeout', type=float, default=None,
+                              help='seconds a unit may run before it is treated as hung and retried')
+    sweep_parser.add_argument('--top', type=int, default=10, help='number of best results to show')
+    sweep_parser.set_defaults(func=sweep)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'sweep' and args.action in ['enqueue', 'work'] and args.prices is None:
+        parser.error('sweep {} requires --prices'.format(args.action))
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
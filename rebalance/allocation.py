@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+
+def _per_account(values, accounts, assets):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]  # One value per account
+    return np.broadcast_to(values, (accounts, assets))
+
+
+def batch_allocation(weights, latest_prices, account_values, lot_sizes=1, cash_buffers=0.0):
+
+    """
+    Converts one set of weights into share orders for many accounts at once. Each account buys whole lots up to its
+    target value in every asset, then the leftover cash buys one extra lot of the assets furthest below target, the
+    same way pypfopt's greedy allocation does, vectorised across accounts instead of solving one LP per account:
+    :param weights: dict or series of cleaned weights
+    :param latest_prices: series of latest prices, indexed by ticker
+    :param account_values: series (indexed by account) or array of account values in dollars
+    :param lot_sizes: minimum lot in shares, either a scalar, one per account, or an accounts x assets array
+    :param cash_buffers: fraction of each account kept in cash, either a scalar or one per account
+    :return: tuple of (dataframe of shares, accounts x tickers, series of leftover cash per account)
+    """
+    weights = pd.Series(weights, dtype=np.float64)
+    weights = weights[weights > 0]
+    tickers = list(weights.index)
+    prices = latest_prices[tickers].to_numpy(dtype=np.float64)
+    w = weights.to_numpy()
+
+    if isinstance(account_values, pd.Series):
+        accounts = account_values.index
+    else:
+        accounts = pd.RangeIndex(len(account_values))
+    values = np.asarray(account_values, dtype=np.float64)
+    n_accounts, n_assets = len(values), len(tickers)
+
+    lots = _per_account(lot_sizes, n_accounts, n_assets)
+    buffers = np.broadcast_to(np.asarray(cash_buffers, dtype=np.float64), (n_accounts,))
+    investable = values * (1 - buffers)
+
+    # Whole lots up to each target
+    lot_cost = lots * prices
+    target_value = investable[:, None] * w
+    n_lots = np.floor(target_value / lot_cost)
+    leftover = investable - (n_lots * lot_cost).sum(axis=1)
+
+    # Spend the leftover cash on the assets furthest below target. After the first step every asset is less than
+    # one lot below target, so each asset is topped up at most once and this takes at most n_assets rounds
+    rows = np.arange(n_accounts)
+    for _ in range(n_assets):
+        shortfall = target_value - n_lots * lot_cost
+        score = np.where(lot_cost <= leftover[:, None], shortfall, -np.inf)
+        best = score.argmax(axis=1)
+        buy = score[rows, best] > 0
+        if not buy.any():
+            break
+        n_lots[rows[buy], best[buy]] += 1
+        leftover[buy] -= lot_cost[rows[buy], best[buy]]
+
+    shares = pd.DataFrame((n_lots * lots).astype(np.int64), index=accounts, columns=tickers)
+    return shares, pd.Series(leftover + values * buffers, index=accounts, name='Leftover')
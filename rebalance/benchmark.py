@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+def benchmark_name(benchmark):
+
+    """
+    :param benchmark: ticker, or dict of {ticker: weight} for a static-weight blend
+    :return: display name, e.g. 'SPY' or '60/40 SPY/TLT'
+    """
+    if isinstance(benchmark, dict):
+        return '{} {}'.format('/'.join('{:g}'.format(100 * x) for x in benchmark.values()), '/'.join(benchmark))
+    return benchmark
+
+
+def benchmark_returns(daily_ret, benchmarks):
+
+    """
+    Calculates the daily returns of every benchmark with a single matrix product:
+    :param daily_ret: dataframe of daily log returns, one column per ticker
+    :param benchmarks: list of tickers and/or dicts of {ticker: weight}, e.g. ['SPY', {'SPY': 0.6, 'TLT': 0.4}]
+    :return: dataframe of daily returns, one column per benchmark
+    """
+    tickers = list(daily_ret.columns)
+    benchmark_weights = np.zeros((len(tickers), len(benchmarks)))
+    for j, benchmark in enumerate(benchmarks):
+        blend = benchmark if isinstance(benchmark, dict) else {benchmark: 1.0}
+        for ticker, weight in blend.items():
+            benchmark_weights[tickers.index(ticker), j] = weight
+    return pd.DataFrame(daily_ret.to_numpy() @ benchmark_weights, index=daily_ret.index,
+                        columns=[benchmark_name(x) for x in benchmarks])
+
+
+def equity_curves(returns, portfolio_value):
+
+    """
+    Calculates portfolio values from daily returns, the first row being the initial portfolio value:
+    :param returns: dataframe (or series) of daily returns
+    :param portfolio_value: amount in dollars for initial portfolio value
+    :return: dataframe (or series) of portfolio values
+    """
+    growth = returns + 1
+    growth.iloc[0] = 1
+    return growth.cumprod() * portfolio_value
+
+
+def relative_stats(strategy_returns, benchmark_returns, periods=250):
+
+    """
+    Calculates the strategy's statistics relative to each benchmark in one vectorised pass:
+    :param strategy_returns: series of daily strategy returns
+    :param benchmark_returns: dataframe of daily benchmark returns, one column per benchmark
+    :param periods: number of trading days in a year, 250 to match the Sharpe ratio in the models
+    :return: dataframe of tracking error, information ratio, beta and up/down capture, one row per benchmark
+    """
+    strategy_returns, benchmark_returns = pd.Series(strategy_returns).align(benchmark_returns, join='inner', axis=0)
+    r = strategy_returns.to_numpy()[:, None]
+    b = benchmark_returns.to_numpy()
+
+    active = r - b
+    tracking_error = active.std(axis=0, ddof=1) * periods**0.5
+    information_ratio = active.mean(axis=0) * periods / tracking_error
+
+    r_demeaned = r - r.mean()
+    b_demeaned = b - b.mean(axis=0)
+    beta = (r_demeaned * b_demeaned).sum(axis=0) / (b_demeaned ** 2).sum(axis=0)
+
+    up = b > 0
+    down = b < 0
+    up_capture = ((r * up).sum(axis=0) / up.sum(axis=0)) / ((b * up).sum(axis=0) / up.sum(axis=0))
+    down_capture = ((r * down).sum(axis=0) / down.sum(axis=0)) / ((b * down).sum(axis=0) / down.sum(axis=0))
+
+    return pd.DataFrame({'Tracking Error': tracking_error, 'Information Ratio': information_ratio, 'Beta': beta,
+                         'Up Capture': up_capture, 'Down Capture': down_capture},
+                        index=benchmark_returns.columns)
@@ -0,0 +1,120 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from importlib import metadata
+
+import pandas as pd
+
+# Libraries whose upgrades can change cached results, their installed versions are part of every key
+LIBRARIES = ['numpy', 'pandas', 'scipy', 'cvxpy', 'pyportfolioopt']
+
+
+@functools.lru_cache(maxsize=None)
+def _library_versions():
+    versions = {}
+    for name in LIBRARIES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def window_fingerprint(prices_dataframe, config):
+
+    """
+    Calculates a cache key for a rebalance window from its price data and the settings used to process it:
+    :param prices_dataframe: dataframe of prices and dates for the window
+    :param config: dict of estimator and optimiser settings (must be json serialisable, or convertible with str).
+                   Include a version number and bump it whenever the code that computes the results changes
+    :return: hex string that changes whenever the window's prices, dates, tickers, settings or the installed
+             versions of LIBRARIES change
+    """
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(prices_dataframe, index=True).values.tobytes())
+    h.update(json.dumps(list(map(str, prices_dataframe.columns))).encode())
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    h.update(json.dumps(_library_versions(), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+
+    """
+    Persistent on-disk cache of per-window results (expected returns, covariance matrix, weights, allocation), with
+    least recently used eviction once the cache holds more than max_entries results or max_bytes on disk:
+    :param directory: directory the results are pickled into
+    :param max_entries: maximum number of cached windows
+    :param max_bytes: maximum total size of the cache on disk
+    """
+
+    def __init__(self, directory='cache', max_entries=1000, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+
+        """
+        :param key: key from window_fingerprint
+        :return: the cached result, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)  # Mark as recently used
+        return result
+
+    def put(self, key, result):
+
+        """
+        :param key: key from window_fingerprint
+        :param result: picklable result to store
+        """
+        # Write to a temporary file first, so an interrupted run never leaves a half-written result behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+
+        """
+        Removes the least recently used results until the cache is within max_entries and max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total_bytes = sum(x[1] for x in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            mtime, size, path = entries.pop(0)
+            os.remove(path)
+            total_bytes -= size
+
+    def cached(self, key, compute):
+
+        """
+        Returns the cached result for key, calling compute() and storing its result on a miss:
+        :param key: key from window_fingerprint
+        :param compute: function with no arguments that calculates the result
+        :return: the cached or freshly computed result
+        """
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
@@ -0,0 +1,136 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def write_return_store(csv_path, store_dir, tickers=None, chunksize=100000):
+
+    """
+    Converts a price csv into an on-disk store of log returns that can be memory-mapped, reading the csv in
+    chunks so the full price history never has to fit in memory:
+    :param csv_path: path to a price csv (first column dates or timestamps, one column per ticker)
+    :param store_dir: directory to write the store into
+    :param tickers: list of tickers to keep, defaults to every column in the csv
+    :param chunksize: number of csv rows read at a time
+    :return: number of return rows written to the store
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    rows = 0
+    last_prices = None  # Last price row of the previous chunk, needed for the first return of the next one
+    with open(os.path.join(store_dir, 'returns.f64'), 'wb') as returns_file, \
+            open(os.path.join(store_dir, 'dates.i64'), 'wb') as dates_file:
+        for chunk in pd.read_csv(csv_path, index_col=0, chunksize=chunksize, encoding='utf-8-sig'):
+            chunk = chunk.dropna()
+            if tickers is None:
+                tickers = list(chunk.columns)
+            prices = chunk[tickers].to_numpy(dtype=np.float64)
+            # Nanosecond timestamps, so intraday bars keep their time of day
+            dates = pd.to_datetime(chunk.index).values.astype('datetime64[ns]').astype(np.int64)
+            if last_prices is not None:
+                prices = np.vstack([last_prices, prices])
+            else:
+                dates = dates[1:]  # Dropping first date, which has no previous close
+            if len(prices) > 1:
+                np.log(prices[1:] / prices[:-1]).tofile(returns_file)
+                dates.tofile(dates_file)
+                rows += len(dates)
+            if len(prices):
+                last_prices = prices[-1:]
+
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump({'tickers': list(tickers), 'rows': rows}, f)
+    return rows
+
+
+def open_return_store(store_dir):
+
+    """
+    Memory-maps a return store written by write_return_store, without reading it into memory:
+    :param store_dir: directory of the store
+    :return: tuple of (dates as datetime64[ns] memmap, log returns memmap of shape rows x tickers, list of tickers)
+    """
+    with open(os.path.join(store_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    shape = (meta['rows'], len(meta['tickers']))
+    dates = np.memmap(os.path.join(store_dir, 'dates.i64'), dtype=np.int64, mode='r', shape=(shape[0],))
+    returns = np.memmap(os.path.join(store_dir, 'returns.f64'), dtype=np.float64, mode='r', shape=shape)
+    return dates.view('datetime64[ns]'), returns, meta['tickers']
+
+
+def chunked_backtest(store_dir, rebalance_dates, weights, portfolio_value, block_size=65536, window=252):
+
+    """
+    Runs the portfolio value and drawdown calculations over a return store one date block at a time. Only the NAV
+    and the last (window - 1) NAVs for the rolling drawdown are carried across blocks, so peak memory depends on
+    block_size and not on the length of the history:
+    :param store_dir: directory of a store written by write_return_store
+    :param rebalance_dates: dates on which each row of weights takes effect (sorted)
+    :param weights: dataframe or array of weights (one row per rebalance, columns in the store's ticker order)
+    :param portfolio_value: amount in dollars for initial portfolio value
+    :param block_size: number of return rows processed at a time
+    :param window: number of rows (bars) in the rolling max used for the drawdown, 252 for daily bars as in the
+                   models
+    :return: generator of (dates, portfolio value, drawdown) array tuples, one per block
+    """
+    dates, returns, tickers = open_return_store(store_dir)
+    if isinstance(weights, pd.DataFrame):
+        weights = weights[tickers]
+    # Days before the first rebalance are held in cash, like the zero weights backtest_frame in the models
+    weights = np.vstack([np.zeros(len(tickers)), np.asarray(weights, dtype=np.float64)])
+    rebalance_dates = pd.to_datetime(rebalance_dates).values.astype('datetime64[ns]')
+
+    nav = float(portfolio_value)
+    nav_buffer = np.full(window - 1, -np.inf)  # -inf padding gives the same result as rolling(min_periods=1)
+
+    for start in range(0, len(returns), block_size):
+        block_dates = np.asarray(dates[start:start + block_size])
+        block_returns = np.asarray(returns[start:start + block_size])
+
+        # Current weights for each day of the block
+        weights_index = np.searchsorted(rebalance_dates, block_dates, side='right')
+        daily_pct_return = np.einsum('ij,ij->i', weights[weights_index], block_returns) + 1
+
+        block_nav = nav * np.cumprod(daily_pct_return)
+        nav = block_nav[-1]
+
+        # Rolling max drawdown, using the NAVs carried over from the previous block
+        extended_nav = np.concatenate([nav_buffer, block_nav])
+        rolling_max = sliding_window_view(extended_nav, window).max(axis=1)
+        drawdown = block_nav / rolling_max - 1.0
+        nav_buffer = extended_nav[-(window - 1):]
+
+        yield block_dates, block_nav, drawdown
+
+
+def chunked_stats(blocks, periods_per_year=250):
+
+    """
+    Calculates the models' summary statistics from the output of chunked_backtest using running sums, so the blocks
+    never need to be held in memory together:
+    :param blocks: iterable of (dates, portfolio value, drawdown) tuples
+    :param periods_per_year: number of bars in a year, used to annualise the Sharpe ratio (250 for daily bars, as
+                             in the models)
+    :return: dict of final portfolio value, max drawdown and annualised Sharpe ratio
+    """
+    count = 0
+    total = 0.0
+    total_sq = 0.0
+    max_drawdown = 0.0
+    previous_nav = None
+    nav = np.nan
+    for dates, nav_block, drawdown in blocks:
+        if previous_nav is not None:
+            nav_block = np.concatenate([[previous_nav], nav_block])
+        daily_pct_return = nav_block[1:] / nav_block[:-1] - 1
+        count += len(daily_pct_return)
+        total += daily_pct_return.sum()
+        total_sq += (daily_pct_return ** 2).sum()
+        max_drawdown = min(max_drawdown, drawdown.min())
+        previous_nav = nav = nav_block[-1]
+
+    mean = total / count
+    std = ((total_sq - count * mean ** 2) / (count - 1)) ** 0.5
+    return {'Portfolio Value': nav, 'Max Drawdown': max_drawdown, 'Sharpe Ratio': (periods_per_year**0.5) * mean / std}
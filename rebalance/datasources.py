@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import io
+import os
+import threading
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+FRED_URL = 'https://fred.stlouisfed.org/graph/fredgraph.csv?id={name}'
+
+
+def _parse_csv(source, name, start=None, end=None):
+    series = pd.read_csv(source, index_col=0, encoding='utf-8-sig').dropna()
+    series.index = pd.to_datetime(series.index)
+    if name in series.columns:
+        series = series[[name]]
+    elif len(series.columns) == 1:
+        series.columns = [name]
+    else:
+        raise KeyError('{} not found in columns {}'.format(name, list(series.columns)))
+    return series.loc[start:end]
+
+
+class LocalFileSource:
+
+    """
+    Reads series from local csv files, e.g. LocalFileSource('data/{name}.csv') for data/UNRATE.csv, or
+    LocalFileSource('data/price_data_annual.csv') to pull single tickers out of a price file:
+    :param path_template: path of the csv, where {name} is replaced by the series name
+    """
+
+    def __init__(self, path_template='data/{name}.csv'):
+        self.path_template = path_template
+
+    async def fetch(self, name, start=None, end=None, timeout=None):
+        path = self.path_template.format(name=name)
+        return await asyncio.to_thread(_parse_csv, path, name, start, end)
+
+
+class HTTPSource:
+
+    """
+    Downloads series as csv over HTTP, e.g. HTTPSource(FRED_URL) for FRED series, or a local stand-in server
+    started with serve_directory:
+    :param url_template: url of the csv, where {name} is replaced by the series name
+    """
+
+    def __init__(self, url_template=FRED_URL):
+        self.url_template = url_template
+
+    def _download(self, name, timeout):
+        with urllib.request.urlopen(self.url_template.format(name=name), timeout=timeout) as response:
+            return response.read().decode('utf-8-sig')
+
+    async def fetch(self, name, start=None, end=None, timeout=None):
+        text = await asyncio.to_thread(self._download, name, timeout)
+        return _parse_csv(io.StringIO(text), name, start, end)
+
+
+class YahooSource:
+
+    """
+    Downloads adjusted closes from Yahoo Finance, one ticker per request.
+    """
+
+    def _download(self, name, start, end, timeout):
+        import yfinance as yf
+        # yfinance now defaults to auto_adjust=True, which drops the Adj Close column, and to a (field, ticker)
+        # column index even for a single ticker
+        prices = yf.download(name, start=start, end=end, auto_adjust=False, multi_level_index=False, progress=False,
+                             timeout=timeout)[['Adj Close']].dropna()
+        prices.columns = [name]
+        return prices
+
+    async def fetch(self, name, start=None, end=None, timeout=None):
+        return await asyncio.to_thread(self._download, name, start, end, timeout)
+
+
+# Network errors and timeouts are worth retrying, anything else (e.g. a missing column) fails straight away
+RETRY_ERRORS = (OSError, TimeoutError, asyncio.TimeoutError)
+
+
+async def _fetch_one(semaphore, source, name, start, end, retries, timeout, backoff):
+    async with semaphore:
+        for attempt in range(retries + 1):
+            download = asyncio.ensure_future(source.fetch(name, start, end, timeout))
+            try:
+                return await asyncio.wait_for(asyncio.shield(download), timeout)
+            except RETRY_ERRORS:
+                # A timed out attempt keeps running in its thread until the source's own timeout fires, so it
+                # holds on to its slot until then and no more than concurrency downloads are ever running
+                await asyncio.gather(download, return_exceptions=True)
+                if not download.cancelled() and download.exception() is None:
+                    return download.result()  # It got there in the end, no need to ask again
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(backoff * 2 ** attempt)
+
+
+async def fetch_all(requests, start=None, end=None, concurrency=8, retries=2, timeout=30.0, backoff=0.5,
+                    cache_dir='data/cache'):
+
+    """
+    Fetches many series concurrently, so refreshing every ticker plus the FRED series takes about one round trip
+    instead of the sum of sequential downloads:
+    :param requests: list of (source, name) tuples, e.g. [(YahooSource(), 'SPY'), (HTTPSource(), 'UNRATE')]
+    :param start: first date to keep (yyyy-mm-dd), defaults to the start of the series
+    :param end: last date to keep (yyyy-mm-dd), defaults to the end of the series
+    :param concurrency: maximum number of requests in flight at once
+    :param retries: number of times a request that failed with a network error or timed out is retried, with
+                    exponential backoff
+    :param timeout: seconds allowed for each attempt, also passed on to the source's own network calls
+    :param backoff: seconds to wait before the first retry
+    :param cache_dir: directory each series is written to as <name>.csv, or None to skip writing
+    :return: dict of {name: dataframe}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    names = [name for source, name in requests]
+    results = await asyncio.gather(
+        *[_fetch_one(semaphore, source, name, start, end, retries, timeout, backoff) for source, name in requests],
+        return_exceptions=True)
+
+    failed = {name: result for name, result in zip(names, results) if isinstance(result, BaseException)}
+    if failed:
+        raise RuntimeError('Failed to fetch {}'.format(
+            ', '.join('{} ({!r})'.format(name, error) for name, error in failed.items())))
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, result in zip(names, results):
+            result.to_csv(os.path.join(cache_dir, '{}.csv'.format(name)))
+    return dict(zip(names, results))
+
+
+def refresh(requests, **kwargs):
+
+    """
+    Synchronous wrapper around fetch_all, for use from the scripts:
+    :param requests: list of (source, name) tuples
+    :return: dict of {name: dataframe}
+    """
+    return asyncio.run(fetch_all(requests, **kwargs))
+
+
+def combine(results, names):
+
+    """
+    :param results: dict of {name: dataframe} from fetch_all
+    :param names: names to combine, in column order
+    :return: dataframe with one column per name, on the dates they all share
+    """
+    return pd.concat([results[name] for name in names], axis=1, join='inner')
+
+
+def serve_directory(directory, port=0, handler_class=SimpleHTTPRequestHandler):
+
+    """
+    Starts a local HTTP server in a background thread serving the files in a directory, as a stand-in for a
+    remote data source:
+    :param directory: directory to serve
+    :param port: port to listen on, 0 picks a free one
+    :param handler_class: request handler, a SimpleHTTPRequestHandler subclass can add latency or errors
+    :return: tuple of (server, base url). Call server.shutdown() to stop it
+    """
+    handler = functools.partial(handler_class, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
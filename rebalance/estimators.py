@@ -0,0 +1,65 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def window_views(matrix, starts, window):
+
+    """
+    Builds strided (zero-copy) views of every training window:
+    :param matrix: array of shape days x assets
+    :param starts: row where each window starts
+    :param window: number of rows in each window
+    :return: array of shape windows x assets x window. It is a view of matrix when the windows are evenly spaced,
+             as they are for a fixed rebalance cadence, and a gathered copy otherwise
+    """
+    views = sliding_window_view(matrix, window, axis=0)
+    starts = np.asarray(starts)
+    steps = np.diff(starts)
+    if len(starts) > 1 and steps[0] > 0 and (steps == steps[0]).all():
+        return views[starts[0]:starts[-1] + 1:steps[0]]
+    return views[starts]
+
+
+def batched_expected_returns(log_returns, starts, window, method='ema', span=500, frequency=252, risk_free_rate=0.0):
+
+    """
+    Calculates the expected returns of every training window in a single vectorised call. Matches pypfopt's
+    ema_historical_return, mean_historical_return and capm_return (with compounding, and the equal-weighted
+    market used when no market prices are given) applied to each window's prices:
+    :param log_returns: dataframe or array of daily log returns (days x assets) for the whole history
+    :param starts: row of log_returns where each window starts. A window of prices p[z - n:z] has its returns in
+                   rows z - n to z - 2 of log_returns = np.log(prices / prices.shift(1))[1:], i.e. start z - n
+    :param window: number of returns in each window (number of prices minus 1)
+    :param method: 'ema', 'mean' or 'capm'
+    :param span: span of the exponential moving average, used by 'ema'
+    :param frequency: number of trading days in a year
+    :param risk_free_rate: annual risk-free rate, used by 'capm'. Defaults to pypfopt's 0.0
+    :return: array of annualised expected returns of shape windows x assets
+    """
+    log_returns = np.asarray(log_returns, dtype=np.float64)
+
+    if method == 'ema':
+        alpha = 2 / (span + 1)
+        ema_weights = (1 - alpha) ** np.arange(window - 1, -1, -1)
+        ema_weights /= ema_weights.sum()
+        simple_returns = np.expm1(log_returns)
+        ema = window_views(simple_returns, starts, window) @ ema_weights
+        return (1 + ema) ** frequency - 1
+
+    if method == 'mean':
+        # (1 + r).prod() is the exponential of the sum of log returns
+        return np.expm1(window_views(log_returns, starts, window).sum(axis=-1) * frequency / window)
+
+    if method == 'capm':
+        simple_returns = np.expm1(log_returns)
+        market_returns = simple_returns.mean(axis=1)
+        asset_views = window_views(simple_returns, starts, window)
+        market_views = window_views(market_returns, starts, window)
+        asset_demeaned = asset_views - asset_views.mean(axis=-1, keepdims=True)
+        market_demeaned = market_views - market_views.mean(axis=-1, keepdims=True)
+        betas = np.einsum('wat,wt->wa', asset_demeaned, market_demeaned) / \
+            (market_demeaned ** 2).sum(axis=-1, keepdims=True)
+        market_mean_return = np.exp(np.log1p(market_views).sum(axis=-1, keepdims=True) * frequency / window) - 1
+        return risk_free_rate + betas * (market_mean_return - risk_free_rate)
+
+    raise ValueError("method must be 'ema', 'mean' or 'capm', got {!r}".format(method))
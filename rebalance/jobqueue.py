@@ -0,0 +1,236 @@
+"""
+SQLite job queue for running sweeps across several processes or machines. A coordinator enqueues work units (a
+config plus the fingerprint of the data it must run on), workers claim units under a time-limited lease and write
+their results back. While a unit runs, its worker renews the lease from a heartbeat thread, so long units are not
+handed out twice. Units whose worker failed are retried, and units whose lease ran out (a crashed worker, or a
+hung one past its timeout) are claimed again by another worker. To spread a sweep over several nodes, put the
+database on a filesystem they all mount with working file locks.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    config TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    UNIQUE (config, fingerprint)
+)
+"""
+
+
+def file_fingerprint(path):
+
+    """
+    :param path: data file
+    :return: sha256 hex digest of the file's contents
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def connect(path):
+
+    """
+    Opens the queue, creating it if needed:
+    :param path: SQLite database file
+    :return: sqlite3 connection in autocommit mode (transactions are started explicitly)
+    """
+    db = sqlite3.connect(path, timeout=60, isolation_level=None)
+    db.execute(SCHEMA)
+    return db
+
+
+def enqueue(db, configs, fingerprint):
+
+    """
+    Adds work units to the queue. Units already in the queue (same config and fingerprint) are skipped, so a
+    coordinator can safely be rerun:
+    :param db: connection from connect
+    :param configs: list of json serialisable config dicts
+    :param fingerprint: fingerprint of the data the configs must be evaluated on
+    :return: number of units added
+    """
+    before = db.total_changes
+    db.execute('BEGIN IMMEDIATE')
+    db.executemany('INSERT OR IGNORE INTO jobs (config, fingerprint) VALUES (?, ?)',
+                   [(json.dumps(config, sort_keys=True), fingerprint) for config in configs])
+    db.execute('COMMIT')
+    return db.total_changes - before
+
+
+def claim(db, worker, lease=600.0, max_attempts=3, fingerprint=None):
+
+    """
+    Claims the next pending unit, or a running unit whose lease has expired:
+    :param db: connection from connect
+    :param worker: name of the worker claiming the unit
+    :param lease: seconds the unit is held before it can be claimed by another worker, unless renewed
+    :param max_attempts: units are not claimed again once they have been attempted this many times
+    :param fingerprint: only claim units enqueued with this data fingerprint, None to claim any unit
+    :return: tuple of (job id, config dict, fingerprint), or None if there is nothing to claim
+    """
+    now = time.time()
+    db.execute('BEGIN IMMEDIATE')  # Takes the write lock, so two workers can't claim the same unit
+    try:
+        # Units whose last allowed attempt ran out of time are given up on
+        db.execute("UPDATE jobs SET status = 'failed', error = COALESCE(error, 'lease expired') "
+                   "WHERE status = 'running' AND lease_until < ? AND attempts >= ?", (now, max_attempts))
+        row = db.execute("SELECT id, config, fingerprint FROM jobs "
+                         "WHERE attempts < ? AND (status = 'pending' OR (status = 'running' AND lease_until < ?)) "
+                         "AND (? IS NULL OR fingerprint = ?) ORDER BY id LIMIT 1",
+                         (max_attempts, now, fingerprint, fingerprint)).fetchone()
+        if row is not None:
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                       "WHERE id = ?", (worker, now + lease, row[0]))
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    if row is None:
+        return None
+    return row[0], json.loads(row[1]), row[2]
+
+
+def renew(db, job_id, worker, lease=600.0):
+
+    """
+    Extends the lease on a unit that is still running:
+    :param db: connection from connect
+    :param job_id: id from claim
+    :param worker: name of the worker that claimed the unit
+    :param lease: seconds from now until the unit can be claimed by another worker
+    :return: True if the worker still holds the unit
+    """
+    cursor = db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                        (time.time() + lease, job_id, worker))
+    return cursor.rowcount == 1
+
+
+def _heartbeat(path, job_id, worker, lease, stop, deadline):
+    # Runs in its own thread with its own connection, sqlite3 connections can't be shared between threads
+    db = connect(path)
+    try:
+        while not stop.wait(lease / 3):
+            if deadline is not None and time.time() >= deadline:
+                break  # Treated as hung, the lease is left to run out so another worker can take the unit
+            if not renew(db, job_id, worker, lease):
+                break
+    finally:
+        db.close()
+
+
+def complete(db, job_id, worker, result):
+
+    """
+    Stores a unit's result. Ignored if the unit's lease has since been taken over by another worker:
+    :param db: connection from connect
+    :param job_id: id from claim
+    :param worker: name of the worker that claimed the unit
+    :param result: json serialisable result
+    :return: True if the result was stored
+    """
+    cursor = db.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL "
+                        "WHERE id = ? AND worker = ? AND status = 'running'", (json.dumps(result), job_id, worker))
+    return cursor.rowcount == 1
+
+
+def fail(db, job_id, worker, error, max_attempts=3):
+
+    """
+    Records a failed attempt. The unit goes back to pending until it has been attempted max_attempts times:
+    :param db: connection from connect
+    :param job_id: id from claim
+    :param worker: name of the worker that claimed the unit
+    :param error: error message
+    :param max_attempts: attempts after which the unit is marked as failed
+    """
+    db.execute("UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, error = ?, "
+               "lease_until = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+               (max_attempts, error, job_id, worker))
+
+
+def progress(db):
+
+    """
+    :param db: connection from connect
+    :return: dict of {status: number of units}
+    """
+    return dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+def results(db):
+
+    """
+    :param db: connection from connect
+    :return: list of (config dict, result) for every finished unit
+    """
+    return [(json.loads(config), json.loads(result))
+            for config, result in db.execute("SELECT config, result FROM jobs WHERE status = 'done' ORDER BY id")]
+
+
+def run_worker(path, evaluate, worker=None, lease=600.0, max_attempts=3, poll=1.0, timeout=None, fingerprint=None):
+
+    """
+    Claims and evaluates units until the queue has nothing left to run:
+    :param path: SQLite database file
+    :param evaluate: function taking (config, fingerprint) and returning a json serialisable result
+    :param worker: name of this worker, defaults to <hostname>-<pid>
+    :param lease: seconds a unit is held without a heartbeat before another worker may claim it. The lease is
+                  renewed every lease / 3 seconds while the unit runs
+    :param max_attempts: attempts per unit before it is marked as failed
+    :param poll: seconds to wait while other workers still hold leases on the remaining units
+    :param timeout: seconds a unit may run before its lease stops being renewed, None to renew until it finishes
+    :param fingerprint: fingerprint of this worker's copy of the data. Only units enqueued with the same data are
+                        claimed, so a worker with a stale or different file leaves them, and their attempts, to
+                        the others. None to claim every unit
+    :return: number of units this worker completed
+    """
+    if worker is None:
+        worker = '{}-{}'.format(socket.gethostname(), os.getpid())
+    db = connect(path)
+    completed = 0
+    while True:
+        job = claim(db, worker, lease, max_attempts, fingerprint)
+        if job is None:
+            # Units still running elsewhere may come back if their worker dies, so wait for them to finish
+            running = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running' AND attempts < ? "
+                                 "AND (? IS NULL OR fingerprint = ?)",
+                                 (max_attempts, fingerprint, fingerprint)).fetchone()[0]
+            if running == 0:
+                break
+            time.sleep(poll)
+            continue
+
+        job_id, config, fingerprint = job
+        stop = threading.Event()
+        deadline = None if timeout is None else time.time() + timeout
+        heartbeat = threading.Thread(target=_heartbeat, args=(path, job_id, worker, lease, stop, deadline),
+                                     daemon=True)
+        heartbeat.start()
+        try:
+            result = evaluate(config, fingerprint)
+        except Exception:
+            fail(db, job_id, worker, traceback.format_exc(), max_attempts)
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+        completed += complete(db, job_id, worker, result)
+    db.close()
+    return completed
@@ -0,0 +1,125 @@
+"""
+Kernels for the path-dependent parts of the backtests that can't be written as a single cumprod. They loop over
+typed arrays (float64 returns, boolean masks) and are compiled with Numba when it is installed. Without Numba the
+same loops run as plain Python with NumPy operations across assets, and gtt_nav uses a vectorised NumPy version.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+@njit(cache=True)
+def _gtt_nav(daily_pct_return, invested, portfolio_value):
+    nav = np.empty(len(daily_pct_return))
+    nav[0] = portfolio_value
+    for t in range(1, len(daily_pct_return)):
+        nav[t] = nav[t - 1] * (daily_pct_return[t] if invested[t] else 1.0)
+    return nav
+
+
+@njit(cache=True)
+def _nav_with_costs(returns, target_weights, rebalance, cost, band, portfolio_value):
+    days, assets = returns.shape
+    nav = np.empty(days)
+    turnover = np.zeros(days)
+    weights = np.zeros(assets)
+    value = portfolio_value
+    for t in range(days):
+        if rebalance[t]:
+            # Only trade the assets that have drifted outside the no-trade band
+            trades = target_weights[t] - weights
+            for a in range(assets):
+                if abs(trades[a]) <= band:
+                    trades[a] = 0.0
+            turnover[t] = np.abs(trades).sum()
+            value *= 1.0 - cost * turnover[t]
+            weights = weights + trades
+        gross = 1.0 + (weights * returns[t]).sum()
+        value *= gross
+        if gross != 0.0:
+            weights = weights * (1.0 + returns[t]) / gross
+        nav[t] = value
+    return nav, turnover
+
+
+@njit(cache=True)
+def _derisk_nav(daily_returns, threshold, exposure_after, recovery, portfolio_value):
+    days = len(daily_returns)
+    nav = np.empty(days)
+    exposure = np.empty(days)
+    value = portfolio_value
+    peak = portfolio_value
+    current = 1.0
+    for t in range(days):
+        exposure[t] = current
+        value *= 1.0 + current * daily_returns[t]
+        peak = max(peak, value)
+        drawdown = value / peak - 1.0
+        # Cut exposure when the drawdown crosses the threshold, restore it once the drawdown recovers
+        if drawdown <= threshold:
+            current = exposure_after
+        elif drawdown >= recovery:
+            current = 1.0
+        nav[t] = value
+    return nav, exposure
+
+
+def gtt_nav(daily_pct_return, invested, portfolio_value):
+
+    """
+    Portfolio value for the GTT switch to cash, as in Primary_GTT:
+    :param daily_pct_return: array of daily growth factors (daily return + 1)
+    :param invested: boolean array, False on days the signal holds cash (growth factor of 1)
+    :param portfolio_value: amount in dollars for initial portfolio value (the value on the first day)
+    :return: array of portfolio values
+    """
+    daily_pct_return = np.ascontiguousarray(daily_pct_return, dtype=np.float64)
+    invested = np.ascontiguousarray(invested, dtype=np.bool_)
+    if NUMBA_AVAILABLE:
+        return _gtt_nav(daily_pct_return, invested, float(portfolio_value))
+    growth = np.where(invested, daily_pct_return, 1.0)
+    growth[0] = 1.0
+    return portfolio_value * np.cumprod(growth)
+
+
+def nav_with_costs(returns, target_weights, rebalance, cost=0.001, band=0.0, portfolio_value=1.0):
+
+    """
+    Portfolio value with proportional trading costs and a no-trade band, letting the weights drift between
+    rebalances:
+    :param returns: array of daily simple returns (days x assets)
+    :param target_weights: array of target weights for each day (days x assets)
+    :param rebalance: boolean array, True on rebalance days
+    :param cost: cost per unit of turnover, e.g. 0.001 for 10bps
+    :param band: assets whose weight is within this distance of target are not traded
+    :param portfolio_value: amount in dollars for initial portfolio value
+    :return: tuple of (array of portfolio values, array of turnover per day)
+    """
+    return _nav_with_costs(np.ascontiguousarray(returns, dtype=np.float64),
+                           np.ascontiguousarray(target_weights, dtype=np.float64),
+                           np.ascontiguousarray(rebalance, dtype=np.bool_),
+                           float(cost), float(band), float(portfolio_value))
+
+
+def derisk_nav(daily_returns, threshold=-0.15, exposure_after=0.5, recovery=-0.05, portfolio_value=1.0):
+
+    """
+    Portfolio value with drawdown-triggered de-risking:
+    :param daily_returns: array of daily simple portfolio returns at full exposure
+    :param threshold: drawdown (negative number) at which exposure is cut
+    :param exposure_after: exposure held while de-risked, the rest is in cash
+    :param recovery: drawdown above which full exposure is restored
+    :param portfolio_value: amount in dollars for initial portfolio value
+    :return: tuple of (array of portfolio values, array of exposure per day)
+    """
+    return _derisk_nav(np.ascontiguousarray(daily_returns, dtype=np.float64), float(threshold),
+                       float(exposure_after), float(recovery), float(portfolio_value))
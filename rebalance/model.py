@@ -0,0 +1,192 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# pypfopt (which pulls in cvxpy), yfinance and pandas_market_calendars are slow to import, so they are imported
+# inside the functions that need them rather than here
+
+
+def load_prices(path):
+
+    """
+    Loads a price file from the data folder:
+    :param path: path to a price csv (first column dates, one column per ticker)
+    :return: dataframe of prices with a datetime index
+    """
+    prices = pd.read_csv(path, index_col=0, encoding='utf-8-sig').dropna()
+    prices.index = pd.to_datetime(prices.index)
+    return prices
+
+
+def download_prices(tickers, start, end):
+
+    """
+    Downloads adjusted closes from Yahoo Finance:
+    :param tickers: list of tickers
+    :param start: start date (yyyy-mm-dd)
+    :param end: end date (yyyy-mm-dd)
+    :return: dataframe of prices with a datetime index
+    """
+    import yfinance as yf
+    # Newer yfinance versions adjust the closes in place and drop 'Adj Close' unless auto_adjust is turned off
+    prices = yf.download(tickers, start=start, end=end, auto_adjust=False, progress=False)['Adj Close'].dropna()
+    prices.index = pd.to_datetime(prices.index)
+    return prices
+
+
+def trading_days(start, end):
+
+    """
+    Gets the NYSE trading days between two dates:
+    :param start: start date (yyyy-mm-dd)
+    :param end: end date (yyyy-mm-dd)
+    :return: list of trading days (yyyy-mm-dd)
+    """
+    import pandas_market_calendars as mcal
+    nyse = mcal.get_calendar('NYSE')
+    return mcal.date_range(nyse.schedule(start, end), frequency='1D').strftime('%Y-%m-%d').tolist()
+
+
+def optimise_weights(prices_dataframe, covariance=None, mu=None):
+
+    """
+    Calculates the max Sharpe portfolio on the efficient frontier for a window of prices:
+    :param prices_dataframe: dataframe of prices and dates for the window
+    :param covariance: function taking (prices_dataframe, expected returns) and returning a covariance matrix,
+                       defaults to the sample covariance of the window
+    :param mu: series of expected returns for the window, defaults to pypfopt's ema_historical_return
+    :return: dict of cleaned weights
+    """
+    from pypfopt import EfficientFrontier, expected_returns, objective_functions, risk_models
+    warnings.simplefilter("ignore", UserWarning)  # Ignore UserWarning generated by .add_objective in pypfopt
+
+    if mu is None:
+        prices_expected_returns = expected_returns.ema_historical_return(prices_dataframe)
+    else:
+        prices_expected_returns = mu
+    if covariance is None:
+        covariance_matrix = risk_models.sample_cov(prices_dataframe)
+    else:
+        covariance_matrix = covariance(prices_dataframe, prices_expected_returns)
+    ef = EfficientFrontier(prices_expected_returns, covariance_matrix)
+
+    # Making the problem into a nonconvex objective because pypfopt changed their backend to a convex optimiser
+    ef.nonconvex_objective(
+        objective_functions.sharpe_ratio,
+        objective_args=(ef.expected_returns, ef.cov_matrix),
+        weights_sum_to_one=True,
+    )
+    return dict(ef.clean_weights())
+
+
+def walk_forward_weights(prices, lookback=63, cadence=21, estimator='ema', covariance=None):
+
+    """
+    Recalculates the max Sharpe weights every cadence days from the previous lookback days of prices, as in
+    Primary 3mo. The expected returns of every window are calculated at once from the full return matrix:
+    :param prices: dataframe of prices with a datetime index
+    :param lookback: number of prices in each training window
+    :param cadence: number of days between rebalances
+    :param estimator: expected returns estimator passed on to batched_expected_returns ('ema', 'mean' or 'capm')
+    :param covariance: function taking (prices_dataframe, expected returns) and returning a covariance matrix,
+                       defaults to cov_matrix_based as in Primary 3mo
+    :return: tuple of (dataframe of weights, dataframe of expected returns), one row per window, indexed by the
+             last date of each training window
+    """
+    from rebalance.estimators import batched_expected_returns
+    from rebalance.functions import cov_matrix_based
+
+    if covariance is None:
+        def covariance(prices_dataframe, mu):
+            return cov_matrix_based(prices_dataframe)
+    tickers = list(prices.columns)
+    daily_ret = np.log(prices / prices.shift(1))[1:]
+    window_ends = list(range(lookback, len(prices), cadence))
+    mu_windows = batched_expected_returns(daily_ret, [z - lookback for z in window_ends], lookback - 1,
+                                          method=estimator)
+
+    weights = []
+    for i, z in enumerate(window_ends):
+        prices_dataframe = prices.iloc[z - lookback:z]
+        mu = pd.Series(mu_windows[i], index=tickers)
+        weights.append(optimise_weights(prices_dataframe, covariance, mu))
+
+    index = prices.index[[z - 1 for z in window_ends]]
+    return pd.DataFrame(weights, index=index, columns=tickers), pd.DataFrame(mu_windows, index=index, columns=tickers)
+
+
+def backtest(prices, weights, portfolio_value=10000, window=252):
+
+    """
+    Backtests rebalance weights over the daily log returns, the way the Primary models do. The weights calculated
+    on the closes up to day t are held from the return after day t + 1 until the next rebalance, with zero weights
+    before the first one. The last row of weights is the live recommendation and is not backtested, so the
+    backtest ends where the last training window ends:
+    :param prices: dataframe of prices with a datetime index
+    :param weights: dataframe of weights (one row per rebalance, indexed by dates in prices, e.g. from
+                    walk_forward_weights)
+    :param portfolio_value: amount in dollars for initial portfolio value
+    :param window: number of days in the rolling max used for the drawdown
+    :return: dict with the 'daily_weights' and daily 'returns' (weighted sum of log returns), 'nav' and 'drawdown'
+             over the backtest, plus the 'annual_return' (average of the yearly sums of daily returns) and the
+             annualised 'sharpe' ratio, as printed by the models
+    """
+    daily_ret = np.log(prices / prices.shift(1))[1:]
+    ends = prices.index.get_indexer(weights.index) + 1  # Rows of daily_ret from which each row of weights is held
+    if (ends <= 0).any():
+        raise KeyError('Rebalance dates not found in prices: {}'.format(list(weights.index[ends <= 0])))
+    rows = np.repeat(np.arange(len(ends)), np.diff(np.concatenate([[0], ends])))
+    held = np.vstack([np.zeros(len(weights.columns)), weights.to_numpy(dtype=np.float64)])[rows]
+
+    daily_ret = daily_ret.iloc[:ends[-1]]
+    daily_weights = pd.DataFrame(held, index=daily_ret.index, columns=weights.columns)
+    returns = daily_weights.mul(daily_ret[weights.columns]).sum(axis=1)
+
+    # The first day is the starting value, its return isn't applied
+    growth = (returns + 1).to_numpy()
+    growth[:1] = portfolio_value
+    nav = pd.Series(np.cumprod(growth), index=daily_ret.index, name='Portfolio Value')
+    drawdown = nav / nav.rolling(window, min_periods=1).max() - 1.0
+    return {'daily_weights': daily_weights,
+            'returns': returns,
+            'nav': nav,
+            'drawdown': drawdown,
+            'annual_return': returns.groupby(pd.Grouper(freq='Y')).apply(np.sum).mean(),
+            'sharpe': (250**0.5) * returns.mean() / returns.std()}
+
+
+def allocate(cleaned_weights, prices_dataframe, portfolio_value):
+
+    """
+    Converts weights into a number of shares at the latest prices. Requires the GLPK_MI solver for CVXPY,
+    which you can install by following these instructions: http://cvxopt.org/install/index.html
+    :param cleaned_weights: dict of weights
+    :param prices_dataframe: dataframe of prices and dates, the last row is used for the allocation
+    :param portfolio_value: amount in dollars to allocate
+    :return: tuple of (dict of shares, leftover cash)
+    """
+    from pypfopt import DiscreteAllocation, get_latest_prices
+    latest_prices = get_latest_prices(prices_dataframe)
+    da = DiscreteAllocation(cleaned_weights, latest_prices, total_portfolio_value=portfolio_value)
+    return da.lp_portfolio()
+
+
+def recommend(prices, portfolio_value, lookback_days=None, add_cash=True, covariance=None):
+
+    """
+    Calculates the recommended weights and shares for the next period, as in Primary 3mo v2.0:
+    :param prices: dataframe of prices with a datetime index
+    :param portfolio_value: amount in dollars to allocate
+    :param lookback_days: number of most recent rows to train on, defaults to all of them
+    :param add_cash: if True, a constant 'CASH' asset priced at 1 is added to the universe
+    :param covariance: covariance function passed on to optimise_weights
+    :return: tuple of (weights series, shares series)
+    """
+    if lookback_days is not None:
+        prices = prices.iloc[-lookback_days:]
+    if add_cash:
+        prices = prices.assign(CASH=np.ones(len(prices)))
+    cleaned_weights = optimise_weights(prices, covariance)
+    allocation, leftover = allocate(cleaned_weights, prices, portfolio_value)
+    return pd.Series(cleaned_weights), pd.Series(allocation, dtype=float)
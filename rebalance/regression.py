@@ -0,0 +1,184 @@
+"""
+Golden-output regression harness for the Primary models. Each model is backtested on the local price files through
+rebalance.model (models that are still only scripts are run with runpy in a scratch directory, so the result cache
+and results/ folder don't leak between runs), and its weights, portfolio values and summary statistics are compared
+with a saved snapshot within numeric tolerances, together with the runtime, so performance rewrites can be checked
+as behaviour-preserving and actually faster.
+
+Only the 3mo model is gated. Primary.py, Primary 6mo.py and Primary_GTT.py import annual_cov, start_date,
+start_of_month, start_date_six and semi_annual_cov from Functions, which no version of Functions.py defines, so
+they can't run until those helpers exist.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(REPO_DIR, 'data', 'golden')
+
+# Model name: settings of its script, backtested with rebalance.model
+MODELS = {
+    '3mo': {'prices': 'Risk-Parity Main - OUTPUT.csv', 'lookback': 63, 'cadence': 21, 'portfolio_value': 10000},
+}
+
+# Model name: (script, name of its weights dataframe), for the models that are still only scripts
+SCRIPTS = {
+    'annual': ('Primary.py', 'weights'),
+    '6mo': ('Primary 6mo.py', 'weights'),
+    'gtt': ('Primary_GTT.py', 'weights'),
+}
+
+# Models checked by default, the ones that can currently run
+GATED = ['3mo']
+
+# Imported before the clock starts, so the runtime is the model's own work and not the import cost
+WARM_IMPORTS = ['numpy', 'pandas', 'scipy.stats', 'matplotlib.pyplot', 'cvxpy', 'pypfopt', 'pandas_market_calendars',
+                'quantstats']
+
+
+def _backtest_model(model):
+    import warnings
+    from rebalance.model import backtest, load_prices, walk_forward_weights
+    warnings.simplefilter('ignore', FutureWarning)
+
+    settings = MODELS[model]
+    prices = load_prices(os.path.join(REPO_DIR, 'data', settings['prices']))
+    weights, mu = walk_forward_weights(prices, settings['lookback'], settings['cadence'])
+    result = backtest(prices, weights, settings['portfolio_value'])
+    # Daily weights from the first rebalance on, the same rows as the weights dataframe of the script
+    return {'weights': result['daily_weights'].iloc[settings['lookback']:].to_numpy(dtype=np.float64),
+            'nav': result['nav'].to_numpy(dtype=np.float64),
+            'stats': np.array([result['annual_return'], result['sharpe'], result['drawdown'].min()])}
+
+
+def _run_script(model):
+    import contextlib
+    import io
+    import runpy
+
+    script, weights_name = SCRIPTS[model]
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runpy.run_path(os.path.join(REPO_DIR, script), run_name='__main__')
+    return {'weights': namespace[weights_name].to_numpy(dtype=np.float64),
+            'nav': namespace['daily_weights_returns']['Portfolio Value'].to_numpy(dtype=np.float64),
+            'stats': np.array([namespace['portfolio_annual_return'], namespace['portfolio_sharpe_annualised'],
+                               namespace['daily_drawdown'].min()], dtype=np.float64)}
+
+
+def _snapshot(model, path):
+    # Runs in a fresh interpreter started by run_model, with the scratch directory as the working directory
+    import importlib
+    import time
+
+    import matplotlib
+    matplotlib.use('Agg')  # plt.show() doesn't block with a non-interactive backend
+    for name in WARM_IMPORTS:
+        importlib.import_module(name)
+
+    tick = time.perf_counter()
+    snapshot = _backtest_model(model) if model in MODELS else _run_script(model)
+    np.savez(path, runtime=time.perf_counter() - tick, **snapshot)
+
+
+def run_model(model, repeats=3):
+
+    """
+    Runs a model headless, each repeat in a fresh Python process, and snapshots its output:
+    :param model: name of the model in MODELS or SCRIPTS
+    :param repeats: number of runs, the fastest of which is reported as the runtime
+    :return: dict of float64 arrays ('weights', 'nav', 'stats') plus the 'runtime' in seconds
+    """
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    runtimes = []
+    with tempfile.TemporaryDirectory() as scratch:
+        os.symlink(os.path.join(REPO_DIR, 'data'), os.path.join(scratch, 'data'))
+        path = os.path.join(scratch, 'snapshot.npz')
+        for _ in range(repeats):
+            process = subprocess.run([sys.executable, '-m', 'rebalance.regression', model, path], cwd=scratch,
+                                     env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if process.returncode != 0:
+                raise RuntimeError('{} failed:\n{}'.format(model, process.stderr))
+            with np.load(path) as f:
+                snapshot = dict(f)
+            runtimes.append(float(snapshot['runtime']))
+    snapshot['runtime'] = min(runtimes)
+    return snapshot
+
+
+def save_golden(snapshot, path):
+
+    """
+    :param snapshot: dict from run_model
+    :param path: .npz file to write
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(path, **snapshot)
+
+
+def compare(snapshot, golden, rtol=1e-7, atol=1e-9):
+
+    """
+    Compares a snapshot with a golden snapshot:
+    :param snapshot: dict from run_model
+    :param golden: dict (or loaded .npz) of the golden snapshot
+    :param rtol: relative tolerance
+    :param atol: absolute tolerance
+    :return: dict of {output: max absolute difference (inf if the shapes differ)} and whether every output matched
+    """
+    differences = {}
+    passed = True
+    for name in ['weights', 'nav', 'stats']:
+        current, expected = snapshot[name], golden[name]
+        if current.shape != expected.shape:
+            differences[name] = np.inf
+            passed = False
+            continue
+        difference = np.abs(current - expected)
+        differences[name] = float(np.nanmax(difference)) if difference.size else 0.0
+        passed &= bool(np.allclose(current, expected, rtol=rtol, atol=atol, equal_nan=True))
+    return differences, passed
+
+
+def run(models=None, golden_dir=GOLDEN_DIR, update=False, rtol=1e-7, atol=1e-9, repeats=3):
+
+    """
+    Runs the models and either saves new golden snapshots or checks against the saved ones:
+    :param models: list of model names, defaults to GATED
+    :param golden_dir: directory of the golden .npz files
+    :param update: if True, overwrite the golden snapshots instead of comparing
+    :param rtol: relative tolerance
+    :param atol: absolute tolerance
+    :param repeats: runs per model, the fastest is compared with the golden runtime
+    :return: True if every model matched its golden snapshot (always True when updating). A model without a golden
+             snapshot fails unless update is set
+    """
+    all_passed = True
+    for model in models or GATED:
+        path = os.path.join(golden_dir, model + '.npz')
+        if not update and not os.path.exists(path):
+            print('{}: FAILED | no golden snapshot at {}, run with --update to create it'.format(model, path))
+            all_passed = False
+            continue
+        snapshot = run_model(model, repeats)
+        if update:
+            save_golden(snapshot, path)
+            print('{}: saved golden snapshot ({:.2f}s)'.format(model, snapshot['runtime']))
+            continue
+        with np.load(path) as golden:
+            golden = dict(golden)
+        differences, passed = compare(snapshot, golden, rtol, atol)
+        all_passed &= passed
+        golden_runtime = float(golden['runtime'])
+        print('{}: {} | max diff weights {:.3g}, nav {:.3g}, stats {:.3g} | runtime {:.2f}s vs {:.2f}s ({:.2f}x)'
+              .format(model, 'OK' if passed else 'CHANGED', differences['weights'], differences['nav'],
+                      differences['stats'], snapshot['runtime'], golden_runtime, golden_runtime / snapshot['runtime']))
+    return all_passed
+
+
+if __name__ == '__main__':
+    _snapshot(*sys.argv[1:])
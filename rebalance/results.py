@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _days(index):
+    return pd.to_datetime(index).values.astype('datetime64[D]').astype(np.int64)
+
+
+def _dates(days):
+    return pd.to_datetime(np.asarray(days).astype('datetime64[D]'))
+
+
+def save_results(path, daily_weights, allocation_shares=None, nav=None, diagnostics=None, rebalance_weights=None):
+
+    """
+    Saves backtest results into a compressed binary .npz file. Only the days on which the weights change are
+    stored, rather than the same weights repeated for every trading day:
+    :param path: file to write (.npz)
+    :param daily_weights: dataframe of daily weights, one column per ticker, indexed by date
+    :param allocation_shares: dataframe of share allocations, one row per rebalance, indexed by the date each
+                              allocation takes effect (optional)
+    :param nav: series of daily portfolio values, indexed by date (optional)
+    :param diagnostics: dataframe of numeric per-window diagnostics, one row per window (optional)
+    :param rebalance_weights: dataframe of the weights chosen at each rebalance, indexed by rebalance date, one row
+                              per window like diagnostics. Unlike daily_weights it includes the final window's
+                              weights, which the backtest never holds (optional)
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    values = daily_weights.to_numpy(dtype=np.float64)
+    changed = np.flatnonzero(np.any(values[1:] != values[:-1], axis=1)) + 1
+    events = np.concatenate([[0], changed])
+
+    arrays = {'dates': _days(daily_weights.index),
+              'event_rows': events,
+              'event_weights': values[events],
+              'tickers': np.array(list(map(str, daily_weights.columns)))}
+    if allocation_shares is not None:
+        arrays['allocation'] = allocation_shares.to_numpy(dtype=np.float64)
+        arrays['allocation_tickers'] = np.array(list(map(str, allocation_shares.columns)))
+        arrays['allocation_dates'] = _days(allocation_shares.index)
+    if nav is not None:
+        arrays['nav'] = np.asarray(nav, dtype=np.float64)
+        arrays['nav_dates'] = _days(nav.index)
+    if diagnostics is not None:
+        arrays['diagnostics'] = diagnostics.to_numpy(dtype=np.float64)
+        arrays['diagnostics_columns'] = np.array(list(map(str, diagnostics.columns)))
+    if rebalance_weights is not None:
+        arrays['rebalance_weights'] = rebalance_weights.to_numpy(dtype=np.float64)
+        arrays['rebalance_tickers'] = np.array(list(map(str, rebalance_weights.columns)))
+        arrays['rebalance_dates'] = _days(rebalance_weights.index)
+    np.savez_compressed(path, **arrays)
+
+
+def load_results(path):
+
+    """
+    Loads results saved by save_results:
+    :param path: .npz file
+    :return: dict with 'weights' (dataframe of weights indexed by the dates they take effect), 'dates' (every
+             trading day of the backtest) and, when they were saved, 'allocation', 'nav', 'diagnostics' and
+             'rebalance_weights'
+    """
+    with np.load(path) as f:
+        dates = _dates(f['dates'])
+        results = {'dates': dates,
+                   'weights': pd.DataFrame(f['event_weights'], index=dates[f['event_rows']], columns=f['tickers'])}
+        if 'allocation' in f:
+            results['allocation'] = pd.DataFrame(f['allocation'], index=_dates(f['allocation_dates']),
+                                                 columns=f['allocation_tickers'])
+        if 'nav' in f:
+            results['nav'] = pd.Series(f['nav'], index=_dates(f['nav_dates']), name='Portfolio Value')
+        if 'diagnostics' in f:
+            results['diagnostics'] = pd.DataFrame(f['diagnostics'], columns=f['diagnostics_columns'])
+        if 'rebalance_weights' in f:
+            results['rebalance_weights'] = pd.DataFrame(f['rebalance_weights'], index=_dates(f['rebalance_dates']),
+                                                        columns=f['rebalance_tickers'])
+    return results
+
+
+def daily_weights(results):
+
+    """
+    :param results: dict from load_results
+    :return: dataframe of weights for every trading day, as written by the models before
+    """
+    return results['weights'].reindex(results['dates'], method='ffill')
+
+
+def latest_weights(results):
+
+    """
+    :param results: dict from load_results
+    :return: series of the most recent rebalance weights. These are the final window's weights when they were
+             saved, otherwise the last weights held in the backtest
+    """
+    if 'rebalance_weights' in results:
+        return results['rebalance_weights'].iloc[-1]
+    return results['weights'].iloc[-1]
+
+
+def export_csv(path, directory):
+
+    """
+    Exports a results file to csv files (weights.csv with daily weights, plus allocation.csv, nav.csv,
+    diagnostics.csv and rebalance_weights.csv when they were saved):
+    :param path: .npz file written by save_results
+    :param directory: directory to write the csv files into
+    """
+    results = load_results(path)
+    os.makedirs(directory, exist_ok=True)
+    daily_weights(results).to_csv(os.path.join(directory, 'weights.csv'))
+    for name in ['allocation', 'nav', 'diagnostics', 'rebalance_weights']:
+        if name in results:
+            results[name].to_csv(os.path.join(directory, name + '.csv'))
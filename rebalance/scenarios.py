@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Named historical stress windows, from the peak before each selloff to its trough
+SCENARIOS = {
+    '2008 GFC': ('2008-09-01', '2009-03-09'),
+    '2011 US downgrade': ('2011-07-22', '2011-10-03'),
+    '2013 Taper tantrum': ('2013-05-21', '2013-06-24'),
+    '2015 China devaluation': ('2015-08-10', '2015-08-25'),
+    '2018 Q4 selloff': ('2018-09-20', '2018-12-24'),
+    '2020 COVID crash': ('2020-02-19', '2020-03-23'),
+    '2022 Rate shock': ('2022-01-03', '2022-10-12'),
+}
+
+
+def build_scenarios(prices, scenarios=None):
+
+    """
+    Cuts each scenario window out of the price panel, as each asset's growth since the start of the window:
+    :param prices: dataframe of prices with a datetime index, one column per ticker
+    :param scenarios: dict of {name: (start, end)}, defaults to SCENARIOS
+    :return: dict of {name: dataframe of growth per asset}. Scenarios the prices don't fully cover are left out
+    """
+    if scenarios is None:
+        scenarios = SCENARIOS
+    panel = {}
+    for name, (start, end) in scenarios.items():
+        window = prices.loc[start:end]
+        covered = len(window) > 1 and window.index[0] <= pd.Timestamp(start) + pd.Timedelta(days=7) and \
+            window.index[-1] >= pd.Timestamp(end) - pd.Timedelta(days=7)
+        if not covered:
+            continue
+        panel[name] = window / window.iloc[0]
+    return panel
+
+
+def stress_test(weights, panel):
+
+    """
+    Applies a batch of weight vectors to every scenario at once, holding each portfolio through the window. All
+    scenarios are stacked into one matrix, so the portfolio paths come from a single matrix product:
+    :param weights: dataframe of weights (one row per portfolio) or a single series of weights. A 'CASH' weight
+                    is held at a constant price
+    :param panel: dict from build_scenarios, with at least one scenario
+    :return: tuple of (dataframe of scenario P&L, dataframe of scenario max drawdown), portfolios x scenarios
+    """
+    if isinstance(weights, pd.Series):
+        weights = weights.to_frame().T
+    if not panel:
+        raise ValueError('No scenarios to test, the price history covers none of the scenario windows')
+    tickers = list(next(iter(panel.values())).columns)
+    missing = [x for x in weights.columns if x not in tickers and x != 'CASH' and weights[x].abs().sum() > 0]
+    if missing:
+        raise KeyError('No prices for {}'.format(missing))
+
+    # Cash doesn't move, so its weight adds a constant to every path
+    w = weights.reindex(columns=tickers, fill_value=0.0).fillna(0.0).to_numpy(dtype=np.float64)
+    cash = weights['CASH'].fillna(0.0).to_numpy() if 'CASH' in weights.columns else np.zeros(len(weights))
+
+    names = list(panel)
+    lengths = [len(panel[x]) for x in names]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    paths = np.vstack([panel[x].to_numpy(dtype=np.float64) for x in names]) @ w.T + cash
+
+    pnl = np.empty((len(weights), len(names)))
+    drawdown = np.empty((len(weights), len(names)))
+    for j in range(len(names)):
+        path = paths[offsets[j]:offsets[j + 1]]
+        pnl[:, j] = path[-1] / path[0] - 1
+        drawdown[:, j] = (path / np.maximum.accumulate(path, axis=0) - 1).min(axis=0)
+
+    return (pd.DataFrame(pnl, index=weights.index, columns=names),
+            pd.DataFrame(drawdown, index=weights.index, columns=names))
@@ -0,0 +1,157 @@
+import itertools
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from rebalance.estimators import batched_expected_returns, window_views
+from rebalance.jobqueue import file_fingerprint
+from rebalance.model import backtest
+
+# Fidelity of each rung of the search: the number of most recent days backtested (None for the full history) and
+# how the frontier is solved ('coarse' picks the best of a fixed set of sampled portfolios, 'full' solves the max
+# Sharpe problem with pypfopt)
+RUNGS = [
+    {'history': 756, 'frontier': 'coarse'},
+    {'history': 1512, 'frontier': 'coarse'},
+    {'history': None, 'frontier': 'full'},
+]
+
+# Annual risk-free rate of the Sharpe ratio maximised at every rung, so coarse and full rungs rank portfolios alike
+RISK_FREE_RATE = 0.02
+
+
+def config_grid(lookbacks, cadences, universes, estimators):
+
+    """
+    :param lookbacks: list of training window lengths in days, e.g. [252, 126, 63]
+    :param cadences: list of rebalance periods in days, e.g. [252, 126, 63, 21]
+    :param universes: list of ticker lists
+    :param estimators: list of expected return estimators ('ema', 'mean', 'capm')
+    :return: list of config dicts, one per combination
+    """
+    return [{'lookback': lookback, 'cadence': cadence, 'tickers': list(tickers), 'estimator': estimator}
+            for lookback, cadence, tickers, estimator in itertools.product(lookbacks, cadences, universes, estimators)]
+
+
+def _coarse_weights(mu, sigma, samples=2000, seed=42):
+    # The same long-only portfolios are scored in every window, with all windows handled in one pass
+    candidates = np.random.default_rng(seed).dirichlet(np.ones(mu.shape[1]), samples)
+    candidates = np.vstack([candidates, np.eye(mu.shape[1])])
+    returns = mu @ candidates.T
+    variance = np.einsum('sa,wab,sb->ws', candidates, sigma, candidates)
+    return candidates[np.argmax((returns - RISK_FREE_RATE) / np.sqrt(variance), axis=1)]
+
+
+def _full_weights(mu, sigma, tickers):
+    from pypfopt import EfficientFrontier
+    from pypfopt.exceptions import OptimizationError
+
+    weights = _coarse_weights(mu, sigma)
+    for i in range(len(mu)):
+        ef = EfficientFrontier(pd.Series(mu[i], index=tickers), pd.DataFrame(sigma[i], index=tickers, columns=tickers))
+        try:
+            ef.max_sharpe(risk_free_rate=RISK_FREE_RATE)
+        except (OptimizationError, ValueError):
+            continue  # No asset beats the risk-free rate, keep the sampled portfolio for this window
+        weights[i] = pd.Series(ef.clean_weights())[tickers].to_numpy()
+    return weights
+
+
+def evaluate_config(prices, config, fidelity):
+
+    """
+    Backtests one configuration and scores it by its annualised Sharpe ratio:
+    :param prices: dataframe of prices with a datetime index
+    :param config: dict with 'lookback', 'cadence', 'tickers' and 'estimator'
+    :param fidelity: dict with 'history' and 'frontier', as in RUNGS
+    :return: annualised Sharpe ratio of the daily portfolio returns
+    """
+    tickers = config['tickers']
+    lookback, cadence = config['lookback'], config['cadence']
+    prices = prices[tickers]
+    if fidelity['history'] is not None:
+        prices = prices.iloc[-(fidelity['history'] + lookback):]
+    log_returns = np.log(prices / prices.shift(1))[1:].to_numpy()
+
+    # Windows of prices p[z - lookback:z], same as walk_forward_weights
+    window_ends = np.arange(lookback, len(prices), cadence)
+    starts = window_ends - lookback
+    mu = batched_expected_returns(log_returns, starts, lookback - 1, method=config['estimator'])
+    views = window_views(np.expm1(log_returns), starts, lookback - 1)
+    demeaned = views - views.mean(axis=-1, keepdims=True)
+    sigma = np.einsum('wat,wbt->wab', demeaned, demeaned) / (lookback - 2) * 252
+
+    if fidelity['frontier'] == 'full':
+        weights = _full_weights(mu, sigma, tickers)
+    else:
+        weights = _coarse_weights(mu, sigma)
+
+    # Same backtest as the models, scored from the first rebalance on so that longer lookbacks aren't penalised for
+    # the days held in cash
+    result = backtest(prices, pd.DataFrame(weights, index=prices.index[window_ends - 1], columns=tickers))
+    daily_ret = result['returns'].iloc[lookback:]
+    return (250**0.5) * daily_ret.mean() / daily_ret.std()
+
+
+def successive_halving(prices, configs, rungs=None, eta=3, executor=None):
+
+    """
+    Searches over configurations by scoring all of them cheaply first, keeping the best 1/eta at each rung, and
+    only running the full-history, full-precision backtest on the survivors:
+    :param prices: dataframe of prices with a datetime index
+    :param configs: list of config dicts, e.g. from config_grid
+    :param rungs: list of fidelities, from cheapest to full, defaults to RUNGS
+    :param eta: fraction of configurations dropped at each rung (keep 1/eta)
+    :param executor: optional concurrent.futures executor to evaluate each rung's configurations in parallel
+    :return: list of (config, score) for the final rung, best first
+    """
+    if rungs is None:
+        rungs = RUNGS
+    full_history = len(prices)
+    full_budget = len(configs) * full_history  # Day-evaluations an exhaustive full-history grid would cost
+    used_budget = 0
+    survivors = list(configs)
+
+    for level, fidelity in enumerate(rungs):
+        tick = time.perf_counter()
+        arguments = ([prices] * len(survivors), survivors, [fidelity] * len(survivors))
+        if executor is None:
+            scores = list(map(evaluate_config, *arguments))
+        else:
+            scores = list(executor.map(evaluate_config, *arguments))
+        ranked = sorted(zip(survivors, scores), key=lambda x: -np.nan_to_num(x[1], nan=-np.inf))
+
+        used_budget += len(survivors) * min(fidelity['history'] or full_history, full_history)
+        print('Rung {}/{}: {} configs, {} days, {} frontier, {:.1f}s | best Sharpe {:.3} | '
+              'budget used {:.0%} of the full grid'.format(
+                  level + 1, len(rungs), len(survivors), fidelity['history'] or full_history, fidelity['frontier'],
+                  time.perf_counter() - tick, ranked[0][1], used_budget / full_budget))
+
+        if level == len(rungs) - 1:
+            return ranked
+        survivors = [config for config, score in ranked[:max(1, math.ceil(len(ranked) / eta))]]
+
+
+_loaded_prices = {}
+
+
+def evaluate_unit(prices_path, config, fingerprint):
+
+    """
+    Evaluates a sweep work unit from the job queue with the full-history, full-precision backtest:
+    :param prices_path: this worker's copy of the price csv
+    :param config: config dict from the unit
+    :param fingerprint: fingerprint of the data the unit was enqueued with
+    :return: dict with the unit's Sharpe ratio
+    """
+    from rebalance.model import load_prices
+
+    # Load and check the price file once per worker process, not once per unit
+    if prices_path not in _loaded_prices:
+        _loaded_prices[prices_path] = (file_fingerprint(prices_path), load_prices(prices_path))
+    local_fingerprint, prices = _loaded_prices[prices_path]
+    if local_fingerprint != fingerprint:
+        raise ValueError('{} does not match the data the unit was enqueued with'.format(prices_path))
+    return {'sharpe': float(evaluate_config(prices, config, RUNGS[-1]))}
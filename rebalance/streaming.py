@@ -0,0 +1,108 @@
+import csv
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+
+def replay_prices(path, tickers):
+
+    """
+    Replays a local price file one trading day at a time, as if the closes were arriving live:
+    :param path: path to a price csv (first column dates in m/d/yyyy or yyyy-mm-dd format, one column per ticker)
+    :param tickers: list of tickers to pull from the file, in the order the weights are given
+    :return: generator of (date, closes) tuples, where closes is a float64 array aligned with tickers
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [header.index(x) for x in tickers]
+        for row in reader:
+            if not row or not row[0]:
+                continue
+            try:
+                closes = np.array([float(row[i]) for i in columns])
+            except ValueError:  # Skip rows with missing prices, same as .dropna() in the models
+                continue
+            date_format = '%Y-%m-%d' if '-' in row[0] else '%m/%d/%Y'
+            yield datetime.strptime(row[0], date_format), closes
+
+
+def mark_to_market(closes, weights, portfolio_value, drift_threshold=0.05, drawdown_threshold=-0.10,
+                   vol_window=21, rebalance_on_event=False):
+
+    """
+    Marks a portfolio to market on each new daily close, updating its state in O(assets) per step instead of
+    recomputing the whole history:
+    :param closes: iterable of (date, closes) tuples, e.g. the output of replay_prices
+    :param weights: target weights (pd.Series or array) aligned with the closes
+    :param portfolio_value: amount in dollars invested at the first close
+    :param drift_threshold: largest absolute difference between current and target weights before a 'drift' event
+    :param drawdown_threshold: drawdown from the running peak (negative number) that raises a 'drawdown' event
+    :param vol_window: number of daily returns used for the realised volatility
+    :param rebalance_on_event: if True, holdings are reset to the target weights whenever an event is raised
+    :return: generator of dicts with the date, NAV, drawdown, annualised realised vol, drift, current weights and
+             event ('drift', 'drawdown' or None) for each close
+    """
+    target = np.asarray(weights, dtype=np.float64)
+    shares = None
+    peak = portfolio_value
+    previous_nav = None
+    drawdown_active = False
+    drift_active = False
+
+    # Rolling sums of daily log returns, so the volatility update doesn't revisit the window
+    window = deque(maxlen=vol_window)
+    window_sum = 0.0
+    window_sum_sq = 0.0
+
+    for date, close in closes:
+        if shares is None:
+            shares = target * portfolio_value / close  # Buy the target portfolio at the first close
+        positions = shares * close
+        nav = positions.sum()
+
+        # Realised volatility, from the second close on (there is no return on the day the portfolio is bought)
+        if previous_nav is not None:
+            daily_ret = np.log(nav / previous_nav)
+            if len(window) == window.maxlen:
+                oldest = window[0]
+                window_sum -= oldest
+                window_sum_sq -= oldest ** 2
+            window.append(daily_ret)
+            window_sum += daily_ret
+            window_sum_sq += daily_ret ** 2
+        if len(window) > 1:
+            variance = (window_sum_sq - window_sum ** 2 / len(window)) / (len(window) - 1)
+            realised_vol = (252 * max(variance, 0.0)) ** 0.5
+        else:
+            realised_vol = np.nan
+
+        # Drawdown and drift from target weights
+        peak = max(peak, nav)
+        drawdown = nav / peak - 1.0
+        current_weights = positions / nav
+        drift = np.abs(current_weights - target).max()
+
+        # Only raise an event when its threshold is first crossed, not on every day past it. A drawdown takes
+        # priority, and a drift crossed on the same close is raised on the next close instead of being lost
+        event = None
+        if drawdown > drawdown_threshold:
+            drawdown_active = False
+        elif not drawdown_active:
+            event = 'drawdown'
+            drawdown_active = True
+        if drift < drift_threshold:
+            drift_active = False
+        elif event is None and not drift_active:
+            event = 'drift'
+            drift_active = True
+
+        yield {'date': date, 'nav': nav, 'drawdown': drawdown, 'realised_vol': realised_vol, 'drift': drift,
+               'weights': current_weights, 'event': event}
+
+        # Out-of-cycle rebalance back to target weights at today's close
+        if event is not None and rebalance_on_event:
+            shares = target * nav / close
+            drift_active = False  # Holdings are back on target
+        previous_nav = nav
@@ -0,0 +1,66 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalance import cache as cache_module
+from rebalance.cache import ResultCache, window_fingerprint
+
+
+@pytest.fixture
+def prices():
+    return pd.DataFrame({'SPY': [1.0, 1.1, 1.2], 'TLT': [2.0, 1.9, 2.1]}, index=pd.date_range('2020-01-01', periods=3))
+
+
+def test_window_fingerprint_changes_with_prices_settings_and_versions(prices, monkeypatch):
+    key = window_fingerprint(prices, {'version': 1})
+    assert window_fingerprint(prices.copy(), {'version': 1}) == key
+    assert window_fingerprint(prices, {'version': 2}) != key
+
+    changed = prices.copy()
+    changed.iloc[1, 0] = 1.11
+    assert window_fingerprint(changed, {'version': 1}) != key
+
+    monkeypatch.setattr(cache_module, '_library_versions', lambda: {'pyportfolioopt': '99.0'})
+    assert window_fingerprint(prices, {'version': 1}) != key
+
+
+def test_cached_computes_on_a_miss_and_reuses_on_a_hit(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'weights': np.array([0.25, 0.75])}
+
+    assert cache.get('a') is None
+    first = cache.cached('a', compute)
+    second = ResultCache(str(tmp_path)).cached('a', compute)  # Persists across instances, i.e. across runs
+    assert len(calls) == 1
+    np.testing.assert_array_equal(first['weights'], second['weights'])
+
+
+def test_evicts_least_recently_used_by_entries(tmp_path):
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    cache.put('b', 2)
+    time.sleep(0.02)
+    assert cache.get('a') == 1  # 'a' is now more recently used than 'b'
+    time.sleep(0.02)
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_evicts_least_recently_used_by_bytes(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=25000)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, bytes(10000))
+        time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.get('b') is not None and cache.get('c') is not None
+    assert sum(x.stat().st_size for x in os.scandir(tmp_path)) <= 25000
+    assert not [x for x in os.listdir(tmp_path) if x.endswith('.tmp')]
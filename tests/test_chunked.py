@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalance.chunked import chunked_backtest, chunked_stats, open_return_store, write_return_store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def in_memory_backtest(prices, rebalance_dates, weights, portfolio_value, window):
+    prices = prices.dropna()
+    log_returns = np.log(prices / prices.shift(1))[1:]
+    weights = np.vstack([np.zeros(len(prices.columns)), weights])
+    active = np.searchsorted(pd.to_datetime(rebalance_dates).values, log_returns.index.values, side='right')
+    nav = portfolio_value * np.cumprod(np.einsum('ij,ij->i', weights[active], log_returns.to_numpy()) + 1)
+    drawdown = nav / pd.Series(nav).rolling(window, min_periods=1).max().to_numpy() - 1.0
+    return log_returns.index, nav, drawdown
+
+
+@pytest.fixture
+def prices_csv(tmp_path):
+    prices = pd.read_csv(os.path.join(DATA_DIR, 'price_data_3mo.csv'), index_col=0, parse_dates=True,
+                         encoding='utf-8-sig').iloc[:400]
+    # Missing prices at the start, on both sides of chunk boundaries (every 7 rows) and across a whole chunk
+    for row in [0, 6, 7, 13, 14, 15, 100]:
+        prices.iloc[row, row % len(prices.columns)] = np.nan
+    prices.iloc[21:28] = np.nan
+    path = tmp_path / 'prices.csv'
+    prices.to_csv(path)
+    return path, prices
+
+
+def test_chunked_backtest_matches_in_memory_backtest(prices_csv, tmp_path):
+    path, prices = prices_csv
+    rows = write_return_store(path, tmp_path / 'store', chunksize=7)
+    dates, returns, tickers = open_return_store(tmp_path / 'store')
+    assert rows == len(prices.dropna()) - 1
+    assert tickers == list(prices.columns)
+
+    rebalance_dates = ['2007-03-01', '2007-06-01', '2008-01-02']
+    weights = np.random.default_rng(0).dirichlet(np.ones(len(tickers)), len(rebalance_dates))
+    expected_dates, expected_nav, expected_drawdown = in_memory_backtest(prices, rebalance_dates, weights, 9200, 20)
+
+    blocks = list(chunked_backtest(tmp_path / 'store', rebalance_dates, weights, 9200, block_size=5, window=20))
+    np.testing.assert_array_equal(np.concatenate([x[0] for x in blocks]), expected_dates.values)
+    np.testing.assert_allclose(np.concatenate([x[1] for x in blocks]), expected_nav, rtol=1e-11)
+    np.testing.assert_allclose(np.concatenate([x[2] for x in blocks]), expected_drawdown, atol=1e-11)
+
+    stats = chunked_stats(blocks)
+    daily_pct_return = expected_nav[1:] / expected_nav[:-1] - 1
+    assert stats['Portfolio Value'] == pytest.approx(expected_nav[-1], rel=1e-11)
+    assert stats['Max Drawdown'] == pytest.approx(expected_drawdown.min(), abs=1e-11)
+    assert stats['Sharpe Ratio'] == pytest.approx(250**0.5 * daily_pct_return.mean() / daily_pct_return.std(ddof=1))
+
+
+def test_intraday_timestamps_are_kept(tmp_path):
+    index = pd.date_range('2024-01-02 09:30', periods=30, freq='min')
+    pd.DataFrame({'A': np.linspace(100, 110, 30), 'B': np.linspace(50, 45, 30)}, index=index).to_csv(tmp_path / 'm.csv')
+    write_return_store(tmp_path / 'm.csv', tmp_path / 'store', chunksize=4)
+    dates, returns, tickers = open_return_store(tmp_path / 'store')
+    np.testing.assert_array_equal(dates, index.values[1:])
+
+    blocks = list(chunked_backtest(tmp_path / 'store', [index[10]], [[0.5, 0.5]], 100, block_size=8, window=5))
+    nav = np.concatenate([x[1] for x in blocks])
+    assert (nav[:9] == 100).all() and (nav[9:] != 100).all()  # Weights take effect from the 09:40 bar
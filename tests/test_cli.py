@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from rebalance.__main__ import main
+from rebalance.model import load_prices
+from rebalance.results import save_results
+from rebalance.scenarios import build_scenarios, stress_test
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_monitor_replays_bundled_prices(monkeypatch, capsys):
+    monkeypatch.chdir(REPO_DIR)
+    main(['monitor', '--prices', 'data/price_data_3mo_2.csv', '--replay', 'data/price_data_3mo.csv'])
+    output = capsys.readouterr().out
+    assert 'Recommended portfolio weights (by percent):' in output
+    assert 'CASH' in output
+    assert 'drawdown event' in output
+    assert output.rstrip().splitlines()[-1].startswith('Final NAV: ')
+
+
+def test_sweep_requires_prices_to_enqueue_and_work(tmp_path, capsys):
+    for action in ['enqueue', 'work']:
+        with pytest.raises(SystemExit) as exit_info:
+            main(['sweep', action, '--db', str(tmp_path / 'queue.db')])
+        assert exit_info.value.code == 2
+        assert 'sweep {} requires --prices'.format(action) in capsys.readouterr().err
+    main(['sweep', 'status', '--db', str(tmp_path / 'queue.db')])
+    assert 'Progress: {}' in capsys.readouterr().out
+
+
+def test_chunked_builds_the_store_once(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(REPO_DIR)
+    arguments = ['chunked', '--prices', 'data/price_data_3mo.csv', '--store', str(tmp_path / 'store'), '--chunksize',
+                 '500', '--block-size', '1000']
+    main(arguments)
+    first = capsys.readouterr().out
+    assert 'Wrote 3776 return rows' in first
+    main(arguments)
+    second = capsys.readouterr().out
+    assert 'Wrote' not in second
+    assert [x for x in first.splitlines() if x.startswith('Sharpe Ratio')] == \
+        [x for x in second.splitlines() if x.startswith('Sharpe Ratio')]
+
+
+def test_stress_uses_the_final_rebalance_weights(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(REPO_DIR)
+    dates = pd.bdate_range('2022-11-01', periods=10)
+    rebalance = pd.DataFrame({'SPY': [1.0, 0.0], 'TLT': [0.0, 0.5], 'CASH': [0.0, 0.5]}, index=dates[[0, 9]])
+    path = str(tmp_path / 'model.npz')
+    save_results(path, rebalance.iloc[:1].reindex(dates, method='ffill'), rebalance_weights=rebalance)
+
+    main(['stress', '--prices', 'data/Risk-Parity Main - OUTPUT.csv', '--results', path])
+    output = capsys.readouterr().out
+    pnl, _ = stress_test(rebalance.iloc[-1], build_scenarios(load_prices('data/Risk-Parity Main - OUTPUT.csv')))
+    assert '2008 GFC' in output
+    assert '{:.2%}'.format(pnl.iloc[0]['2008 GFC']) in output
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalance.datasources import HTTPSource, LocalFileSource, YahooSource, refresh, serve_directory
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+TICKERS = ['GLD', 'MDY', 'QQQ', 'SPY', 'TLT', 'VBR', 'VTV', 'PSQ']
+ANNUAL_TICKERS = ['GLD', 'MDY', 'QQQ', 'SPY', 'TLT', 'VBR', 'VTV']
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+
+    """
+    Serves files after a delay, failing the first requests for each path, and counts the requests in flight.
+    """
+
+    delay = 0.0
+    failures = 0
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = {}
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.requests[self.path] = cls.requests.get(self.path, 0) + 1
+            attempt = cls.requests[self.path]
+        try:
+            time.sleep(cls.delay)
+            if attempt <= cls.failures:
+                self.send_error(503)
+            else:
+                super().do_GET()
+        except ConnectionError:
+            pass  # The client gave up on the request
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingSource(HTTPSource):
+
+    """
+    HTTPSource that counts the downloads running in its threads.
+    """
+
+    def __init__(self, url_template):
+        super().__init__(url_template)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _download(self, name, timeout):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            return super()._download(name, timeout)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class SlowSource(LocalFileSource):
+
+    """
+    LocalFileSource that takes longer than the timeout but succeeds, and counts its requests.
+    """
+
+    delay = 0.3
+
+    def __init__(self, path_template):
+        super().__init__(path_template)
+        self.requests = 0
+
+    async def fetch(self, name, start=None, end=None, timeout=None):
+        self.requests += 1
+        await asyncio.to_thread(time.sleep, self.delay)
+        return await super().fetch(name, start, end, timeout)
+
+
+@pytest.fixture
+def server():
+    handler = type('Handler', (SlowHandler,), {'requests': {}})
+    server, base_url = serve_directory(DATA_DIR, handler_class=handler)
+    yield handler, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetches_over_http_and_writes_cache(server, tmp_path):
+    handler, base_url = server
+    requests = [(HTTPSource(base_url + '/price_data_annual.csv?{name}'), x) for x in ANNUAL_TICKERS]
+    requests.append((HTTPSource(base_url + '/{name}.csv'), 'UNRATE'))
+    results = refresh(requests, start='2010-01-01', cache_dir=str(tmp_path))
+
+    local = refresh([(LocalFileSource(os.path.join(DATA_DIR, 'price_data_annual.csv')), 'SPY')], start='2010-01-01',
+                    cache_dir=None)
+    pd.testing.assert_frame_equal(results['SPY'], local['SPY'])
+    for name in ANNUAL_TICKERS + ['UNRATE']:
+        cached = pd.read_csv(tmp_path / '{}.csv'.format(name), index_col=0, parse_dates=True)
+        assert list(cached.columns) == [name]
+        assert len(cached) == len(results[name]) > 0
+
+
+def test_concurrency_is_bounded(server):
+    handler, base_url = server
+    handler.delay = 0.2
+    requests = [(HTTPSource(base_url + '/price_data_3mo_2.csv?{name}'), x) for x in TICKERS]
+
+    tick = time.perf_counter()
+    refresh(requests, concurrency=2, cache_dir=None)
+    elapsed = time.perf_counter() - tick
+    assert handler.max_in_flight == 2
+    assert elapsed >= 4 * handler.delay
+
+    handler.max_in_flight = 0
+    tick = time.perf_counter()
+    refresh(requests, concurrency=len(TICKERS), cache_dir=None)
+    assert handler.max_in_flight > 2
+    assert time.perf_counter() - tick < elapsed
+
+
+def test_network_errors_are_retried(server):
+    handler, base_url = server
+    handler.failures = 2
+    results = refresh([(HTTPSource(base_url + '/{name}.csv'), 'UNRATE')], retries=2, backoff=0.01, cache_dir=None)
+    assert len(results['UNRATE']) > 0
+    assert handler.requests['/UNRATE.csv'] == 3
+
+    with pytest.raises(RuntimeError, match='HTTPError 503'):
+        refresh([(HTTPSource(base_url + '/{name}.csv?again'), 'UNRATE')], retries=1, backoff=0.01, cache_dir=None)
+    assert handler.requests['/UNRATE.csv?again'] == 2
+
+
+def test_other_errors_are_not_retried(server):
+    handler, base_url = server
+    with pytest.raises(RuntimeError, match='KeyError'):
+        refresh([(HTTPSource(base_url + '/price_data_annual.csv?{name}'), 'XYZ')], retries=2, backoff=0.01,
+                cache_dir=None)
+    assert handler.requests['/price_data_annual.csv?XYZ'] == 1
+
+
+def test_timeouts_are_retried_without_exceeding_concurrency(server):
+    handler, base_url = server
+    handler.delay = 1.0
+    source = CountingSource(base_url + '/price_data_3mo_2.csv?{name}')
+    requests = [(source, x) for x in TICKERS[:4]]
+
+    tick = time.perf_counter()
+    with pytest.raises(RuntimeError, match='Timeout'):
+        refresh(requests, concurrency=2, retries=1, timeout=0.2, backoff=0.01, cache_dir=None)
+    assert time.perf_counter() - tick < 4 * handler.delay
+    assert all(handler.requests['/price_data_3mo_2.csv?' + x] == 2 for x in TICKERS[:4])
+    assert source.max_running == 2  # Timed out downloads keep their slot until their thread has finished
+
+
+def test_a_timed_out_download_that_succeeds_is_not_requested_again():
+    source = SlowSource(os.path.join(DATA_DIR, 'price_data_annual.csv'))
+    results = refresh([(source, 'SPY')], retries=2, timeout=0.1, backoff=0.01, cache_dir=None)
+    assert len(results['SPY']) > 0
+    assert source.requests == 1
+
+
+def test_yahoo_source_reads_unadjusted_closes(monkeypatch):
+    yf = pytest.importorskip('yfinance')
+    index = pd.bdate_range('2021-01-01', periods=3)
+
+    def download(tickers, auto_adjust=True, multi_level_index=True, **kwargs):
+        # Mimics yfinance's defaults: no Adj Close column when adjusting, and a (field, ticker) column index
+        fields = ['Close'] if auto_adjust else ['Adj Close', 'Close']
+        prices = pd.DataFrame(np.arange(3.0 * len(fields)).reshape(3, -1), index=index, columns=fields)
+        if multi_level_index:
+            prices.columns = pd.MultiIndex.from_product([fields, [tickers]])
+        return prices
+
+    monkeypatch.setattr(yf, 'download', download)
+    results = refresh([(YahooSource(), 'SPY')], cache_dir=None)
+    pd.testing.assert_frame_equal(results['SPY'], pd.DataFrame({'SPY': [0.0, 2.0, 4.0]}, index=index))
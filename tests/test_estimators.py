@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pypfopt import expected_returns
+
+from rebalance.estimators import batched_expected_returns, window_views
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOOKBACK = 63
+
+PYPFOPT = {'ema': expected_returns.ema_historical_return,
+           'mean': expected_returns.mean_historical_return,
+           'capm': expected_returns.capm_return}
+
+
+@pytest.fixture(scope='module')
+def prices():
+    prices = pd.read_csv(os.path.join(REPO_DIR, 'data', 'price_data_3mo.csv'), index_col=0).dropna()
+    return prices.iloc[:600]
+
+
+@pytest.mark.parametrize('method', ['ema', 'mean', 'capm'])
+@pytest.mark.parametrize('window_ends', [list(range(LOOKBACK, 600, 21)), [63, 70, 140, 141, 400, 599]],
+                         ids=['even', 'uneven'])
+def test_batched_expected_returns_match_pypfopt(prices, method, window_ends):
+    log_returns = np.log(prices / prices.shift(1))[1:]
+    batched = batched_expected_returns(log_returns, [z - LOOKBACK for z in window_ends], LOOKBACK - 1, method=method)
+    expected = np.array([PYPFOPT[method](prices[z - LOOKBACK:z]).to_numpy() for z in window_ends])
+    np.testing.assert_allclose(batched, expected, rtol=1e-10, atol=1e-12)
+
+
+def test_window_views_are_views_only_when_evenly_spaced():
+    matrix = np.arange(40.0).reshape(20, 2)
+    assert np.shares_memory(window_views(matrix, [0, 3, 6, 9], 5), matrix)
+    uneven = window_views(matrix, [0, 3, 7], 5)
+    assert not np.shares_memory(uneven, matrix)
+    np.testing.assert_array_equal(uneven[2], matrix[7:12].T)
@@ -0,0 +1,94 @@
+import functools
+import json
+import os
+import time
+from multiprocessing import Process
+
+from rebalance.jobqueue import connect, enqueue, progress, results, run_worker
+
+LEASE = 0.5
+KINDS = ['ok', 'ok', 'flaky', 'broken', 'slow', 'ok', 'flaky', 'ok', 'slow', 'ok']
+
+
+def evaluate(directory, config, fingerprint):
+    with open(os.path.join(directory, 'runs.log'), 'a') as f:
+        f.write('{}\n'.format(config['unit']))
+    marker = os.path.join(directory, 'failed-{}'.format(config['unit']))
+    if config['kind'] == 'flaky' and not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise OSError('transient failure')
+    if config['kind'] == 'broken':
+        raise ValueError('bad config')
+    if config['kind'] == 'slow':
+        time.sleep(4 * LEASE)  # Several leases long, only the heartbeat keeps other workers off it
+    return {'unit': config['unit'], 'fingerprint': fingerprint}
+
+
+def hang(config, fingerprint):
+    time.sleep(60)
+
+
+def test_workers_retry_failures_and_take_over_from_a_hung_worker(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    db = connect(path)
+    assert enqueue(db, [{'unit': i, 'kind': kind} for i, kind in enumerate(KINDS)], 'abc') == len(KINDS)
+    assert enqueue(db, [{'unit': 0, 'kind': 'ok'}], 'abc') == 0  # Rerunning the coordinator adds nothing
+
+    # A worker that hangs on the first unit it claims, its heartbeat stops renewing the lease after the timeout
+    hung = Process(target=run_worker, args=(path, hang), kwargs={'worker': 'hung', 'lease': LEASE, 'timeout': LEASE,
+                                                                  'poll': 0.05})
+    hung.start()
+    deadline = time.time() + 30
+    while db.execute("SELECT COUNT(*) FROM jobs WHERE worker = 'hung'").fetchone()[0] == 0:
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+    workers = [Process(target=run_worker, args=(path, functools.partial(evaluate, str(tmp_path))),
+                       kwargs={'worker': 'worker-{}'.format(i), 'lease': LEASE, 'poll': 0.05}) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    hung.terminate()
+    hung.join()
+    assert [worker.exitcode for worker in workers] == [0] * 4
+
+    assert progress(db) == {'done': len(KINDS) - 1, 'failed': 1}
+    assert sorted(result['unit'] for config, result in results(db)) == [i for i, x in enumerate(KINDS) if x != 'broken']
+    jobs = {json.loads(config)['unit']: (status, attempts, worker, error)
+            for config, status, attempts, worker, error in db.execute('SELECT config, status, attempts, worker, error '
+                                                                      'FROM jobs')}
+    with open(tmp_path / 'runs.log') as f:
+        runs = [int(x) for x in f.read().split()]
+    db.close()
+
+    # The hung worker's unit was taken over once its lease ran out
+    status, attempts, worker, error = jobs[0]
+    assert (status, attempts) == ('done', 2) and worker != 'hung'
+    for unit, kind in enumerate(KINDS):
+        status, attempts, worker, error = jobs[unit]
+        if kind == 'flaky':
+            assert (status, attempts, runs.count(unit)) == ('done', 2, 2)
+        elif kind == 'broken':
+            assert (status, attempts, runs.count(unit)) == ('failed', 3, 3)
+            assert 'ValueError: bad config' in error
+        elif unit != 0:
+            # Slow units outlive several leases but are renewed by the heartbeat, so they only run once
+            assert (status, attempts, runs.count(unit)) == ('done', 1, 1)
+
+
+def test_workers_only_claim_units_enqueued_with_their_data(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    db = connect(path)
+    enqueue(db, [{'unit': i, 'kind': 'ok'} for i in range(3)], 'abc')
+
+    # A worker with a different copy of the data leaves every unit, and its attempts, to the others
+    assert run_worker(path, functools.partial(evaluate, str(tmp_path)), worker='stale', poll=0.05,
+                      fingerprint='xyz') == 0
+    assert progress(db) == {'pending': 3}
+    assert db.execute('SELECT MAX(attempts) FROM jobs').fetchone()[0] == 0
+
+    assert run_worker(path, functools.partial(evaluate, str(tmp_path)), worker='current', poll=0.05,
+                      fingerprint='abc') == 3
+    assert progress(db) == {'done': 3}
+    assert all(result['fingerprint'] == 'abc' for config, result in results(db))
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from rebalance import kernels
+
+
+def python(kernel):
+    return getattr(kernel, 'py_func', kernel)  # The plain Python loop, also when Numba compiled it
+
+
+def compiled(kernel):
+    return kernel
+
+
+IMPLEMENTATIONS = [pytest.param(python, id='python'),
+                   pytest.param(compiled, id='numba', marks=pytest.mark.skipif(not kernels.NUMBA_AVAILABLE,
+                                                                               reason='Numba is not installed'))]
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(0)
+    return rng.normal(0.0003, 0.02, size=(300, 3))
+
+
+def reference_gtt_nav(daily_pct_return, invested, portfolio_value):
+    nav = [portfolio_value]
+    for t in range(1, len(daily_pct_return)):
+        nav.append(nav[-1] * (daily_pct_return[t] if invested[t] else 1.0))
+    return np.array(nav)
+
+
+def reference_nav_with_costs(returns, target_weights, rebalance, cost, band, portfolio_value):
+    days, assets = returns.shape
+    weights = [0.0] * assets
+    value = portfolio_value
+    nav, turnover = [], []
+    for t in range(days):
+        traded = 0.0
+        if rebalance[t]:
+            for a in range(assets):
+                trade = target_weights[t][a] - weights[a]
+                if abs(trade) > band:
+                    weights[a] += trade
+                    traded += abs(trade)
+            value *= 1.0 - cost * traded
+        gross = 1.0 + sum(weights[a] * returns[t][a] for a in range(assets))
+        value *= gross
+        weights = [weights[a] * (1.0 + returns[t][a]) / gross for a in range(assets)]
+        nav.append(value)
+        turnover.append(traded)
+    return np.array(nav), np.array(turnover)
+
+
+def reference_derisk_nav(daily_returns, threshold, exposure_after, recovery, portfolio_value):
+    value = peak = portfolio_value
+    current = 1.0
+    nav, exposure = [], []
+    for r in daily_returns:
+        exposure.append(current)
+        value *= 1.0 + current * r
+        peak = max(peak, value)
+        if value / peak - 1.0 <= threshold:
+            current = exposure_after
+        elif value / peak - 1.0 >= recovery:
+            current = 1.0
+        nav.append(value)
+    return np.array(nav), np.array(exposure)
+
+
+@pytest.mark.parametrize('implementation', IMPLEMENTATIONS)
+def test_gtt_nav_matches_reference(returns, implementation):
+    growth = 1 + returns[:, 0]
+    invested = np.arange(len(growth)) % 50 < 30
+    expected = reference_gtt_nav(growth, invested, 10000.0)
+    np.testing.assert_allclose(implementation(kernels._gtt_nav)(growth, invested, 10000.0), expected, rtol=1e-12)
+    # The public function, vectorised with NumPy when Numba is not installed
+    np.testing.assert_allclose(kernels.gtt_nav(growth, invested, 10000), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('implementation', IMPLEMENTATIONS)
+@pytest.mark.parametrize('band', [0.0, 0.05])
+def test_nav_with_costs_matches_reference(returns, implementation, band):
+    target_weights = np.repeat([[0.5, 0.3, 0.2], [0.2, 0.3, 0.5]], len(returns) // 2, axis=0)
+    rebalance = np.arange(len(returns)) % 21 == 0
+    args = (returns, target_weights, rebalance, 0.001, band, 10000.0)
+    nav, turnover = implementation(kernels._nav_with_costs)(*args)
+    expected_nav, expected_turnover = reference_nav_with_costs(*args)
+    np.testing.assert_allclose(nav, expected_nav, rtol=1e-12)
+    np.testing.assert_allclose(turnover, expected_turnover, atol=1e-15)
+    assert turnover[0] == pytest.approx(1.0)  # Buying in from cash
+
+
+def test_nav_with_costs_without_costs_or_drift_is_a_fixed_weight_portfolio(returns):
+    target_weights = np.tile([0.5, 0.3, 0.2], (len(returns), 1))
+    nav, turnover = kernels.nav_with_costs(returns, target_weights, np.ones(len(returns), dtype=bool), cost=0.0)
+    np.testing.assert_allclose(nav, np.cumprod(1 + returns @ [0.5, 0.3, 0.2]), rtol=1e-12)
+
+
+@pytest.mark.parametrize('implementation', IMPLEMENTATIONS)
+def test_derisk_nav_matches_reference(returns, implementation):
+    daily_returns = returns.sum(axis=1)
+    args = (daily_returns, -0.1, 0.5, -0.03, 10000.0)
+    nav, exposure = implementation(kernels._derisk_nav)(*args)
+    expected_nav, expected_exposure = reference_derisk_nav(*args)
+    np.testing.assert_allclose(nav, expected_nav, rtol=1e-12)
+    np.testing.assert_array_equal(exposure, expected_exposure)
+    assert set(exposure) == {0.5, 1.0}  # The drawdown crosses both thresholds
+
+
+def test_derisk_nav_never_triggered_is_buy_and_hold(returns):
+    nav, exposure = kernels.derisk_nav(returns[:, 0], threshold=-1.0, recovery=-1.0)
+    np.testing.assert_allclose(nav, np.cumprod(1 + returns[:, 0]), rtol=1e-12)
+    assert (exposure == 1.0).all()
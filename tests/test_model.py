@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalance.model import backtest, download_prices
+
+
+@pytest.fixture
+def prices():
+    index = pd.bdate_range('2021-01-01', periods=10)
+    return pd.DataFrame({'A': 100 * np.cumprod(np.r_[1, np.full(9, 1.01)]),
+                         'B': 50 * np.cumprod(np.r_[1, np.linspace(0.98, 1.02, 9)])}, index=index)
+
+
+def test_backtest_holds_each_rebalance_until_the_next_and_not_the_last(prices):
+    weights = pd.DataFrame([[1.0, 0.0], [0.25, 0.75], [0.0, 1.0]], index=prices.index[[2, 5, 8]], columns=['A', 'B'])
+    result = backtest(prices, weights, portfolio_value=1000)
+    log_returns = np.log(prices / prices.shift(1))[1:]
+
+    # Weights known at the close of row 2 are held from the return into row 4 (daily_ret row 3) onwards
+    expected_weights = np.array([[0, 0]] * 3 + [[1, 0]] * 3 + [[0.25, 0.75]] * 3, dtype=float)
+    np.testing.assert_array_equal(result['daily_weights'].to_numpy(), expected_weights)
+    assert list(result['daily_weights'].index) == list(log_returns.index[:9])
+
+    returns = (expected_weights * log_returns.to_numpy()[:9]).sum(axis=1)
+    np.testing.assert_allclose(result['returns'], returns)
+    nav = 1000 * np.cumprod(np.r_[1, returns[1:] + 1])
+    np.testing.assert_allclose(result['nav'], nav)
+    np.testing.assert_allclose(result['drawdown'], nav / np.maximum.accumulate(nav) - 1)
+    assert result['sharpe'] == pytest.approx(250**0.5 * returns.mean() / returns.std(ddof=1))
+
+
+def test_backtest_rejects_dates_missing_from_prices(prices):
+    weights = pd.DataFrame([[1.0, 0.0]], index=[pd.Timestamp('2021-01-02')], columns=['A', 'B'])
+    with pytest.raises(KeyError):
+        backtest(prices, weights)
+
+
+def test_download_prices_reads_unadjusted_closes(prices, monkeypatch):
+    yfinance = pytest.importorskip('yfinance')
+
+    def download(tickers, start=None, end=None, auto_adjust=True, progress=True, **kwargs):
+        # Same layout as yfinance 1.x: (price, ticker) columns, and no 'Adj Close' when auto adjusting
+        fields = ['Close'] if auto_adjust else ['Adj Close', 'Close']
+        columns = pd.MultiIndex.from_product([fields, tickers], names=['Price', 'Ticker'])
+        return pd.DataFrame(np.tile(prices[tickers].to_numpy(), len(fields)), index=prices.index, columns=columns)
+
+    monkeypatch.setattr(yfinance, 'download', download)
+    downloaded = download_prices(['A', 'B'], '2021-01-01', '2021-01-15')
+    pd.testing.assert_frame_equal(downloaded, prices, check_names=False, check_freq=False)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from rebalance.results import daily_weights, latest_weights, load_results, save_results
+
+
+def test_rebalance_weights_round_trip_with_the_final_window(tmp_path):
+    dates = pd.bdate_range('2021-01-01', periods=6)
+    rebalance = pd.DataFrame([[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]], index=dates[[0, 2, 5]], columns=['A', 'B'])
+    # The backtest only holds the first two windows' weights, the last is for the next period
+    held = rebalance.iloc[:2].reindex(dates, method='ffill')
+    diagnostics = pd.DataFrame({'mu A': [0.1, 0.2, 0.3], 'mu B': [0.3, 0.2, 0.1]})
+    path = str(tmp_path / 'results.npz')
+    save_results(path, held, diagnostics=diagnostics, rebalance_weights=rebalance)
+
+    results = load_results(path)
+    pd.testing.assert_frame_equal(results['rebalance_weights'], rebalance, check_freq=False)
+    assert len(results['rebalance_weights']) == len(results['diagnostics'])
+    pd.testing.assert_frame_equal(daily_weights(results), held, check_freq=False)
+    np.testing.assert_array_equal(latest_weights(results), [0.0, 1.0])
+
+
+def test_latest_weights_falls_back_to_the_last_weights_held(tmp_path):
+    dates = pd.bdate_range('2021-01-01', periods=4)
+    held = pd.DataFrame([[1.0, 0.0], [1.0, 0.0], [0.25, 0.75], [0.25, 0.75]], index=dates, columns=['A', 'B'])
+    path = str(tmp_path / 'results.npz')
+    save_results(path, held)
+    np.testing.assert_array_equal(latest_weights(load_results(path)), [0.25, 0.75])
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalance.scenarios import build_scenarios, stress_test
+
+SCENARIOS = {'Selloff': ('2021-01-04', '2021-01-08'), 'Later': ('2021-01-11', '2021-01-15'),
+             'Not covered': ('2019-01-01', '2019-03-01')}
+
+
+@pytest.fixture
+def prices():
+    index = pd.bdate_range('2021-01-04', periods=10)
+    return pd.DataFrame({'A': [100, 90, 80, 85, 88, 88, 90, 92, 94, 96],
+                         'B': [50, 50, 55, 55, 50, 50, 50, 45, 45, 50]}, index=index, dtype=float)
+
+
+def test_build_scenarios_rebases_covered_windows(prices):
+    panel = build_scenarios(prices, SCENARIOS)
+    assert list(panel) == ['Selloff', 'Later']
+    np.testing.assert_allclose(panel['Selloff']['A'], [1.0, 0.9, 0.8, 0.85, 0.88])
+    np.testing.assert_allclose(panel['Later']['B'], [1.0, 1.0, 0.9, 0.9, 1.0])
+
+
+def test_stress_test_holds_each_portfolio_through_the_window(prices):
+    panel = build_scenarios(prices, SCENARIOS)
+    weights = pd.DataFrame({'A': [1.0, 0.5, 0.5], 'B': [0.0, 0.5, 0.0], 'CASH': [0.0, 0.0, 0.5]},
+                           index=['stocks', 'balanced', 'half cash'])
+    pnl, drawdown = stress_test(weights, panel)
+
+    assert pnl.loc['stocks', 'Selloff'] == pytest.approx(-0.12)
+    assert drawdown.loc['stocks', 'Selloff'] == pytest.approx(-0.2)
+    path = 0.5 * panel['Selloff']['A'] + 0.5 * panel['Selloff']['B']
+    assert pnl.loc['balanced', 'Selloff'] == pytest.approx(path.iloc[-1] - 1)
+    assert drawdown.loc['balanced', 'Selloff'] == pytest.approx((path / path.cummax() - 1).min())
+    # Cash is held at a constant price, halving the moves
+    assert pnl.loc['half cash', 'Selloff'] == pytest.approx(-0.06)
+    assert drawdown.loc['half cash', 'Selloff'] == pytest.approx(-0.1)
+
+    # A single series of weights gives a single row
+    single_pnl, _ = stress_test(weights.loc['stocks'], panel)
+    pd.testing.assert_series_equal(single_pnl.iloc[0], pnl.loc['stocks'])
+
+
+def test_stress_test_rejects_missing_tickers_and_empty_panels(prices):
+    panel = build_scenarios(prices, SCENARIOS)
+    with pytest.raises(KeyError, match='C'):
+        stress_test(pd.Series({'A': 0.5, 'C': 0.5}), panel)
+    # Tickers without prices are fine as long as nothing is held in them
+    pnl, _ = stress_test(pd.Series({'A': 1.0, 'C': 0.0}), panel)
+    assert pnl.iloc[0]['Selloff'] == pytest.approx(-0.12)
+    with pytest.raises(ValueError, match='No scenarios'):
+        stress_test(pd.Series({'A': 1.0}), build_scenarios(prices, {'Not covered': SCENARIOS['Not covered']}))
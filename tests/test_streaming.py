@@ -0,0 +1,53 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from rebalance.streaming import mark_to_market, replay_prices
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def closes(rows):
+    start = datetime(2020, 1, 1)
+    return [(start + timedelta(days=i), np.array(row, dtype=np.float64)) for i, row in enumerate(rows)]
+
+
+def events(snapshots):
+    return [x['event'] for x in snapshots]
+
+
+def test_drift_crossed_with_a_drawdown_is_raised_on_the_next_close():
+    snapshots = list(mark_to_market(closes([[1, 1], [0.5, 1], [0.5, 1], [0.5, 1]]), [0.5, 0.5], 100))
+    assert snapshots[1]['drift'] == pytest.approx(1 / 6)
+    assert snapshots[1]['drawdown'] == pytest.approx(-0.25)
+    assert events(snapshots) == [None, 'drawdown', 'drift', None]
+
+
+def test_events_are_latched_until_the_threshold_is_recrossed():
+    rows = [[1, 1], [1.3, 1], [1.4, 1], [1, 1], [1.3, 1], [1.3, 1]]
+    snapshots = list(mark_to_market(closes(rows), [0.5, 0.5], 100, drift_threshold=0.05, drawdown_threshold=-0.5))
+    assert events(snapshots) == [None, 'drift', None, None, 'drift', None]
+
+
+def test_rebalance_on_event_resets_the_holdings_and_the_drift_latch():
+    rows = [[1, 1], [1.3, 1], [1.3, 1], [1.7, 1]]
+    snapshots = list(mark_to_market(closes(rows), [0.5, 0.5], 100, drift_threshold=0.05, rebalance_on_event=True))
+    assert events(snapshots) == [None, 'drift', None, 'drift']
+    np.testing.assert_allclose(snapshots[2]['weights'], [0.5, 0.5])
+    assert snapshots[3]['nav'] == pytest.approx(snapshots[2]['nav'] * (0.5 * 1.7 / 1.3 + 0.5))
+
+
+def test_realised_vol_matches_the_rolling_std_of_log_returns():
+    history = list(replay_prices(os.path.join(DATA_DIR, 'price_data_3mo.csv'), ['SPY', 'TLT']))[:80]
+    snapshots = list(mark_to_market(history, [0.6, 0.4], 1000, vol_window=21))
+    nav = np.array([x['nav'] for x in snapshots])
+    log_returns = np.diff(np.log(nav))
+
+    # No return on the first close and a single return on the second, so there is no vol until the third
+    assert np.isnan(snapshots[0]['realised_vol']) and np.isnan(snapshots[1]['realised_vol'])
+    assert snapshots[2]['realised_vol'] == pytest.approx(np.std(log_returns[:2], ddof=1) * 252 ** 0.5)
+    for i in range(21, len(snapshots)):
+        expected = np.std(log_returns[i - 21:i], ddof=1) * 252 ** 0.5
+        assert snapshots[i]['realised_vol'] == pytest.approx(expected, rel=1e-9)